@@ -0,0 +1,91 @@
+"""
+Event-loop latency under concurrent highlight traffic.
+
+Runs the same burst of highlight reads twice inside one event loop:
+  * "before": the sync psycopg2 helper called directly from a coroutine,
+    which is what the async FastAPI handlers used to do
+  * "after":  the asyncpg-backed helper the handlers use now
+A probe task sleeps for a fixed tick and records how late it wakes up; that
+overshoot is the time the loop was blocked and unable to serve /progress etc.
+
+Usage (needs a reachable database configured in .secrets.toml):
+    python benchmarks/bench_highlight_event_loop.py --user-id 1 --video-id 1
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+PROBE_TICK = 0.005  # seconds
+
+
+async def probe_loop_lag(samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_TICK)
+        samples.append(time.perf_counter() - start - PROBE_TICK)
+
+
+async def sync_request(user_id, video_id):
+    # Mirrors the old handler: a blocking call on the event loop thread
+    return db.get_highlights_for_video(user_id, video_id)
+
+
+async def async_request(user_id, video_id):
+    return await db.get_highlights_for_video_async(user_id, video_id)
+
+
+async def run_burst(request_fn, user_id, video_id, concurrency, requests):
+    samples, stop = [], asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(samples, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await request_fn(user_id, video_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    return elapsed, samples
+
+
+def report(label, elapsed, samples, requests):
+    samples = sorted(samples) or [0.0]
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<7} {requests / elapsed:>9.1f} req/s   loop lag p50={p50 * 1000:7.2f}ms "
+          f"p99={p99 * 1000:7.2f}ms max={samples[-1] * 1000:7.2f}ms   ({len(samples)} probes)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--video-id", type=int, required=True)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    await db.init_async_pool()
+    # Warm both pools so connection setup is not measured
+    db.get_highlights_for_video(args.user_id, args.video_id)
+    await db.get_highlights_for_video_async(args.user_id, args.video_id)
+
+    for label, fn in (("before", sync_request), ("after", async_request)):
+        elapsed, samples = await run_burst(fn, args.user_id, args.video_id, args.concurrency, args.requests)
+        report(label, elapsed, samples, args.requests)
+
+    await db.close_async_pool()
+    db.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+TikTok page JSON extraction: BeautifulSoup parse vs str.find scan.
+
+For each saved page in benchmarks/fixtures/ this times:
+  * "before": BeautifulSoup(html, "html.parser") + soup.find('script', id=...)
+    for SIGI_STATE, then the whole parse again for the rehydration payload
+    when SIGI_STATE is missing, which is what save_tiktok used to do
+  * "after":  utils.pyktok_patch.extract_tiktok_json on the same body
+and checks that both return the same JSON. The baseline needs
+beautifulsoup4, which the app itself no longer uses.
+
+Usage:
+    python benchmarks/bench_tiktok_json_extract.py --repeat 50
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.pyktok_patch import extract_tiktok_json, TIKTOK_JSON_SCRIPT_IDS  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def soup_extract(html):
+    from bs4 import BeautifulSoup
+    for script_id in TIKTOK_JSON_SCRIPT_IDS:
+        soup = BeautifulSoup(html, "html.parser")
+        tt_script = soup.find('script', attrs={'id': script_id})
+        if tt_script is not None:
+            return script_id, json.loads(tt_script.string)
+    return None, None
+
+
+def time_it(fn, html, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(html)
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of saved TikTok .html pages")
+    args = parser.parse_args()
+
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        after, after_t = time_it(extract_tiktok_json, html, args.repeat)
+        print(f"{os.path.basename(path)} ({len(html) / 1024:.0f} KB, payload {after[0]})")
+        try:
+            before, before_t = time_it(soup_extract, html, args.repeat)
+        except ImportError:
+            before_t = None
+            print("  before: skipped (pip install beautifulsoup4 for the baseline)")
+        else:
+            if before != after:
+                sys.exit(f"  MISMATCH: BeautifulSoup found {before[0]}, extract_tiktok_json found {after[0]}")
+            print(f"  before: median {statistics.median(before_t) * 1000:8.2f} ms")
+        print(f"  after:  median {statistics.median(after_t) * 1000:8.2f} ms", end="")
+        if before_t:
+            print(f"  ({statistics.median(before_t) / statistics.median(after_t):.0f}x faster)")
+        else:
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import db
+from typing import Any, Dict, Optional
+from utils.pyktok_patch import get_new_comments
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+# === Settings ===
+COMMENT_FETCH_MAX = settings.get("COMMENT_FETCH_MAX", 500)  # comments listed per refresh
+COMMENT_STOP_AFTER_SEEN = settings.get("COMMENT_STOP_AFTER_SEEN", 50)  # consecutive older comments before stopping
+COMMENT_FETCH_TIMEOUT = settings.get("COMMENT_FETCH_TIMEOUT", 60)  # seconds before a refresh gives up on the browser
+
+def comment_row(raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Flatten a TikTokApi comment dict into a comments row, or None if it has no cid"""
+    if not raw.get("cid"):
+        return None
+    user = raw.get("user") or {}
+    return {
+        "cid": str(raw["cid"]),
+        "author_username": user.get("unique_id"),
+        "author_nickname": user.get("nickname"),
+        "text": raw.get("text"),
+        "digg_count": raw.get("digg_count"),
+        "reply_count": raw.get("reply_comment_total"),
+        "create_time": int(raw.get("create_time") or 0),
+    }
+
+def ingest_comments(video: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Fetch comments posted since the newest one stored for video (a row from
+    db.get_linked_video) and store them. Comments seen before are skipped by
+    cid in the insert, so overlapping fetches are harmless.
+    """
+    since = db.get_latest_comment_time(video["id"])
+    raw_comments = get_new_comments(video["video_id"], since=since, limit=COMMENT_FETCH_MAX,
+                                    stop_after_seen=COMMENT_STOP_AFTER_SEEN, timeout=COMMENT_FETCH_TIMEOUT)
+    rows = [row for row in map(comment_row, raw_comments) if row]
+    inserted = db.add_comments(video["id"], rows)
+    logger.info(f"Fetched {len(rows)} comments for video {video['id']} (since {since}), {inserted} new")
+    return {"fetched": len(rows), "inserted": inserted}
@@ -1,32 +1,239 @@
+import asyncpg
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 import json
+import threading
+import time
 from typing import List, Dict, Optional, Union
 from utils.utils import get_settings, get_logger
+from utils.video_metadata import VideoMetadata
 from fastapi import HTTPException, status
 # Initialize settings and logger
 settings = get_settings()
 logger = get_logger(settings.LOGS_PATH)
 
-class Database:
-    """Database connection manager with context manager support"""
-    def __enter__(self):
-        self.conn = psycopg2.connect(
+# === Pool settings ===
+DB_POOL_MIN = settings.get("DB_POOL_MIN", 2)
+DB_POOL_MAX = settings.get("DB_POOL_MAX", 30)  # 20 import threads + API handlers
+DB_POOL_TIMEOUT = settings.get("DB_POOL_TIMEOUT", 30)  # seconds to wait for a free connection
+DB_POOL_HEALTHCHECK_IDLE = settings.get("DB_POOL_HEALTHCHECK_IDLE", 60)  # ping connections idle longer than this
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool that blocks when exhausted and health-checks idle connections"""
+    def __init__(self, minconn: int, maxconn: int, timeout: float, healthcheck_idle: float, dsn: str = None):
+        if dsn:
+            self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        else:
+            self._pool = psycopg2.pool.ThreadedConnectionPool(
+                minconn, maxconn,
+                host=settings.DB_HOST,
+                port=settings.DB_PORT,
+                dbname=settings.DB_NAME,
+                user=settings.DB_USER,
+                password=settings.DB_PASSWORD
+            )
+        # ThreadedConnectionPool raises instead of waiting, so gate checkouts with a semaphore
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._timeout = timeout
+        self._healthcheck_idle = healthcheck_idle
+        self._returned_at: Dict[int, float] = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "min_size": minconn,
+            "max_size": maxconn,
+            "in_use": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "discarded": 0,
+        }
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle_since = self._returned_at.get(id(conn))
+        if idle_since is None or time.monotonic() - idle_since < self._healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            # Without autocommit the ping opened a transaction; leave the connection idle
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Check out a connection, waiting up to the pool timeout for a free slot"""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self._timeout):
+            with self._stats_lock:
+                self._stats["timeouts"] += 1
+            raise psycopg2.pool.PoolError(f"Timed out after {self._timeout}s waiting for a database connection")
+        waited = time.monotonic() - start
+        try:
+            conn = self._pool.getconn()
+            # Replace stale connections until we get a live one (bounded by max size)
+            for _ in range(self._stats["max_size"]):
+                if self._is_healthy(conn):
+                    break
+                logger.warning("Discarding unhealthy pooled database connection")
+                self._returned_at.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                with self._stats_lock:
+                    self._stats["discarded"] += 1
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            if waited > 0.001:
+                self._stats["waits"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection to the pool, rolling back anything left open"""
+        try:
+            if not close and not conn.closed:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            close = True
+        close = close or bool(conn.closed)
+        if close:
+            self._returned_at.pop(id(conn), None)
+        else:
+            self._returned_at[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._stats_lock:
+                self._stats["in_use"] -= 1
+                if close:
+                    self._stats["discarded"] += 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Process-wide connection pool, created lazily on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_IDLE)
+                logger.info(f"Database pool created (min={DB_POOL_MIN}, max={DB_POOL_MAX})")
+    return _pool
+
+def get_pool_stats() -> Dict[str, Union[int, float]]:
+    """Pool size and wait metrics, empty until the pool is first used"""
+    return _pool.stats() if _pool is not None else {}
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            logger.info("Database pool closed")
+
+# === Async pool (used by async FastAPI handlers; worker threads keep the sync pool) ===
+ASYNC_DB_POOL_MIN = settings.get("ASYNC_DB_POOL_MIN", 2)
+ASYNC_DB_POOL_MAX = settings.get("ASYNC_DB_POOL_MAX", 10)
+
+_async_pool: Optional[asyncpg.Pool] = None
+
+async def init_async_pool() -> asyncpg.Pool:
+    """Create the asyncpg pool; call once from the application's startup event"""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = await asyncpg.create_pool(
             host=settings.DB_HOST,
             port=settings.DB_PORT,
-            dbname=settings.DB_NAME,
+            database=settings.DB_NAME,
             user=settings.DB_USER,
-            password=settings.DB_PASSWORD
+            password=settings.DB_PASSWORD,
+            min_size=ASYNC_DB_POOL_MIN,
+            max_size=ASYNC_DB_POOL_MAX,
         )
-        self.conn.autocommit = True
-        logger.debug("Database connection established")
+        logger.info(f"Async database pool created (min={ASYNC_DB_POOL_MIN}, max={ASYNC_DB_POOL_MAX})")
+    return _async_pool
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+        logger.info("Async database pool closed")
+
+async def async_execute_query(query: str, *params, fetch: bool = False, single: bool = False):
+    """Async counterpart of execute_query; queries use asyncpg's $1, $2 placeholders"""
+    pool = await init_async_pool()
+    try:
+        logger.debug(f"Executing async query: {query[:100]}...")
+        if fetch:
+            if single or 'RETURNING' in query.upper():
+                row = await pool.fetchrow(query, *params)
+                return dict(row) if row is not None else None
+            return [dict(row) for row in await pool.fetch(query, *params)]
+        # asyncpg returns the command tag, e.g. "UPDATE 1"
+        command_status = await pool.execute(query, *params)
+        return int(command_status.split()[-1]) if command_status.split()[-1].isdigit() else 0
+    except asyncpg.PostgresError as e:
+        logger.error(f"Async database error: {str(e)}", exc_info=True)
+        raise
+
+class Database:
+    """Database connection manager with context manager support
+
+    With autocommit=False the block runs as one transaction: committed on a
+    clean exit, rolled back if it raises.
+    """
+    def __init__(self, autocommit: bool = True):
+        self.autocommit = autocommit
+
+    def __enter__(self):
+        self.conn = get_pool().getconn()
+        try:
+            self.conn.autocommit = self.autocommit
+        except Exception:
+            # __exit__ won't run, so give the connection (and its slot) back here
+            get_pool().putconn(self.conn, close=True)
+            raise
+        logger.debug("Database connection checked out of pool")
         return self.conn
     
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self.autocommit and not self.conn.closed:
+            if exc_type:
+                self.conn.rollback()
+                logger.debug("Transaction rolled back")
+            else:
+                self.conn.commit()
+                logger.debug("Transaction committed")
         if exc_type:
             logger.error("Database operation failed", exc_info=(exc_type, exc_val, exc_tb))
-        self.conn.close()
-        logger.debug("Database connection closed")
+        # Connection-level failures leave the connection unusable, so drop it
+        get_pool().putconn(self.conn, close=isinstance(exc_val, (psycopg2.OperationalError, psycopg2.InterfaceError)))
+        logger.debug("Database connection returned to pool")
 def get_db():
         """
         FastAPI dependency that yields a database connection
@@ -41,8 +248,11 @@ def get_db():
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database connection failed"
             )    
-def execute_query(query: str, params: tuple = None, fetch: bool = False, single: bool = False):
-    """Generic query executor with proper return type handling"""
+def execute_query(query: str, params: tuple = None, fetch: bool = False, single: bool = False, many: bool = False):
+    """Generic query executor with proper return type handling
+
+    RETURNING queries yield a single row unless many=True (multi-row UPDATE ... RETURNING).
+    """
     try:
         with Database() as conn:
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
@@ -50,7 +260,7 @@ def execute_query(query: str, params: tuple = None, fetch: bool = False, single:
                 cur.execute(query, params or ())
                 
                 if fetch:
-                    if single or 'RETURNING' in query.upper():
+                    if single or ('RETURNING' in query.upper() and not many):
                         return cur.fetchone()  # Single dict or None
                     return cur.fetchall()  # List of dicts
                 return cur.rowcount
@@ -95,6 +305,15 @@ def validate_user(email: str, password: str) -> Dict[str, Union[int, str]]:
     logger.info(f"Successful login for user: {email}")
     return {"user_id": user["id"]}
 
+def get_video_by_tiktok_id(tiktok_id: str) -> Optional[Dict]:
+    """Get video by its TikTok video id, whatever URL it was imported from"""
+    return execute_query(
+        "SELECT * FROM videos WHERE video_id = %s",
+        (tiktok_id,),
+        fetch=True,
+        single=True
+    )
+
 def get_video_by_url(url: str) -> Optional[Dict]:
     """Get video by URL"""
     video = execute_query(
@@ -110,48 +329,59 @@ def get_video_by_url(url: str) -> Optional[Dict]:
         return video
     
 
+VIDEO_INSERT_SQL = """
+    INSERT INTO videos (
+        url, file_path, transcript, video_id, video_timestamp,
+        video_duration, video_locationcreated, video_diggcount,
+        video_sharecount, video_commentcount, video_playcount,
+        video_description, video_is_ad, author_username,
+        author_name, author_followercount, author_followingcount,
+        author_heartcount, author_videocount, author_diggcount,
+        author_verified, poi_name, poi_address, poi_city, summary, tags,niche
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,%s)
+    RETURNING id
+"""
+
+def _video_record_params(url: str, file_path: str, transcript: str, metadata: VideoMetadata,
+                         summary: str = None, tags: List[str] = None, niche: str = None) -> tuple:
+    """Build the VIDEO_INSERT_SQL parameters from a downloader metadata record"""
+    return (
+        url, file_path, transcript,
+        metadata.video_id,
+        metadata.video_timestamp,
+        metadata.video_duration,
+        metadata.video_locationcreated,
+        metadata.video_diggcount,
+        metadata.video_sharecount,
+        metadata.video_commentcount,
+        metadata.video_playcount,
+        metadata.video_description,
+        metadata.video_is_ad,
+        metadata.author_username,
+        metadata.author_name,
+        metadata.author_followercount,
+        metadata.author_followingcount,
+        metadata.author_heartcount,
+        metadata.author_videocount,
+        metadata.author_diggcount,
+        metadata.author_verified,
+        metadata.poi_name,
+        metadata.poi_address,
+        metadata.poi_city,
+        summary,
+        json.dumps(tags) if tags else None,
+        niche,
+    )
+
 def add_video_record(url: str, file_path: str, transcript: str, 
-                    metadata: Dict, summary: str = None, tags: List[str] = None,niche: str=None) -> int:
+                    metadata: VideoMetadata, summary: str = None, tags: List[str] = None,niche: str=None) -> int:
     """Add video record with metadata"""
     try:
-        result = execute_query("""
-            INSERT INTO videos (
-                url, file_path, transcript, video_id, video_timestamp,
-                video_duration, video_locationcreated, video_diggcount,
-                video_sharecount, video_commentcount, video_playcount,
-                video_description, video_is_ad, author_username,
-                author_name, author_followercount, author_followingcount,
-                author_heartcount, author_videocount, author_diggcount,
-                author_verified, poi_name, poi_address, poi_city, summary, tags,niche
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,%s)
-            RETURNING id
-        """, (
-            url, file_path, transcript,
-            metadata.get("video_id"),
-            metadata.get("video_timestamp"),
-            metadata.get("video_duration"),
-            metadata.get("video_locationcreated"),
-            metadata.get("video_diggcount"),
-            metadata.get("video_sharecount"),
-            metadata.get("video_commentcount"),
-            metadata.get("video_playcount"),
-            metadata.get("video_description"),
-            metadata.get("video_is_ad") == "True",
-            metadata.get("author_username"),
-            metadata.get("author_name"),
-            metadata.get("author_followercount"),
-            metadata.get("author_followingcount"),
-            metadata.get("author_heartcount"),
-            metadata.get("author_videocount"),
-            metadata.get("author_diggcount"),
-            metadata.get("author_verified") == "True",
-            metadata.get("poi_name"),
-            metadata.get("poi_address"),
-            metadata.get("poi_city"),
-            summary,
-            json.dumps(tags) if tags else None,
-            niche,
-        ), fetch=True)
+        result = execute_query(
+            VIDEO_INSERT_SQL,
+            _video_record_params(url, file_path, transcript, metadata, summary, tags, niche),
+            fetch=True
+        )
         
         logger.info(f"Added video record with ID: {result['id']}")
         return result['id']
@@ -159,6 +389,42 @@ def add_video_record(url: str, file_path: str, transcript: str,
         logger.error(f"Failed to add video record: {str(e)}")
         raise
 
+def save_processed_video(user_id: int, url: str, file_path: str, transcript: str, metadata: VideoMetadata,
+                         summary: str = None, tags: List[str] = None, niche: str = None,
+                         highlights: List[tuple] = None, watchers: List[int] = None) -> int:
+    """
+    Persist a processed video in one transaction: the video row, the user link
+    and all highlights (a single multi-row insert). Nothing is written if any
+    step fails.
+
+    highlights: list of (title, text, color, confidence_score) tuples
+    watchers: other users who asked for the same video while it was
+        importing; they are linked to it too
+    """
+    try:
+        with Database(autocommit=False) as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(
+                    VIDEO_INSERT_SQL,
+                    _video_record_params(url, file_path, transcript, metadata, summary, tags, niche)
+                )
+                video_id = cur.fetchone()["id"]
+                cur.execute(
+                    "INSERT INTO user_videos (user_id, video_id) SELECT unnest(%s::int[]), %s ON CONFLICT DO NOTHING",
+                    ([user_id] + list(watchers or []), video_id)
+                )
+                if highlights:
+                    psycopg2.extras.execute_values(
+                        cur,
+                        "INSERT INTO highlights (user_id, video_id, title, text, color, confidence_score) VALUES %s",
+                        [(user_id, video_id, title, text, color, score) for title, text, color, score in highlights]
+                    )
+        logger.info(f"Saved video {video_id} with {len(highlights or [])} highlights for user {user_id}")
+        return video_id
+    except Exception as e:
+        logger.error(f"Failed to save processed video {url}: {str(e)}")
+        raise
+
 def link_user_video(user_id: int, video_id: int) -> None:
     """Link user to a video"""
     rows = execute_query(
@@ -168,19 +434,83 @@ def link_user_video(user_id: int, video_id: int) -> None:
     if rows > 0:
         logger.debug(f"Linked user {user_id} to video {video_id}")
 
-def get_videos_for_user(user_id: int) -> List[Dict]:
-    """Get all videos for a user exactly as stored in DB"""
+def get_video_ids_by_tiktok_ids(tiktok_ids: List[str]) -> Dict[str, int]:
+    """TikTok video id -> videos.id for those of tiktok_ids already imported, in one query"""
+    if not tiktok_ids:
+        return {}
+    rows = execute_query(
+        "SELECT id, video_id FROM videos WHERE video_id = ANY(%s)",
+        (list(tiktok_ids),),
+        fetch=True
+    )
+    return {row["video_id"]: row["id"] for row in rows}
+
+def link_user_videos(user_id: int, video_ids: List[int]) -> int:
+    """Link many videos to a user in one statement; returns how many links are new"""
+    if not video_ids:
+        return 0
+    rows = execute_query(
+        "INSERT INTO user_videos (user_id, video_id) SELECT %s, unnest(%s::int[]) ON CONFLICT DO NOTHING",
+        (user_id, list(video_ids))
+    )
+    logger.debug(f"Linked user {user_id} to {rows} existing videos")
+    return rows
+
+# Columns the video list views may request through fields=; id is always returned
+VIDEO_LIST_FIELDS = {
+    "id": "v.id",
+    "url": "v.url",
+    "file_path": "v.file_path",
+    "transcript": "v.transcript",
+    "video_playcount": "v.video_playcount",
+    "video_diggcount": "v.video_diggcount",
+    "video_commentcount": "v.video_commentcount",
+    "video_sharecount": "v.video_sharecount",
+    "summary": "v.summary",
+    "video_description": "v.video_description",
+    "tags": "v.tags",
+    "niche": "v.niche",
+    "author_username": "v.author_username",
+    "author_name": "v.author_name",
+}
+# Heavy text columns that list views can skip and fetch per video via get_video_text
+VIDEO_TEXT_FIELDS = ("transcript", "summary")
+
+def get_videos_for_user(user_id: int, limit: Optional[int] = None, before_id: Optional[int] = None,
+                        fields: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Get videos for a user, newest first.
+
+    Keyset-paginated on v.id DESC: pass the last id of the previous page as
+    before_id. fields restricts the selected columns to a subset of
+    VIDEO_LIST_FIELDS (all of them by default).
+    """
     try:
-        videos = execute_query("""
-            SELECT v.id, v.url, v.file_path, v.transcript, 
-                   v.video_playcount, v.video_diggcount,
-                   v.video_commentcount, v.video_sharecount, 
-                   v.summary, v.video_description, v.tags,v.niche,v.author_username,v.author_name
+        if fields:
+            unknown = [f for f in fields if f not in VIDEO_LIST_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown video fields: {', '.join(unknown)}")
+            selected = ["id"] + [f for f in fields if f != "id"]
+        else:
+            selected = list(VIDEO_LIST_FIELDS)
+        columns = ", ".join(VIDEO_LIST_FIELDS[f] for f in selected)
+
+        query = f"""
+            SELECT {columns}
             FROM videos v
             JOIN user_videos uv ON uv.video_id = v.id
             WHERE uv.user_id = %s
-            ORDER BY v.id DESC
-        """, (user_id,), fetch=True)
+        """
+        params = [user_id]
+        if before_id is not None:
+            query += " AND v.id < %s"
+            params.append(before_id)
+        query += " ORDER BY v.id DESC"
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+
+        videos = execute_query(query, tuple(params), fetch=True)
         
         if not videos:
             logger.debug(f"No videos found for user {user_id}")
@@ -189,12 +519,24 @@ def get_videos_for_user(user_id: int) -> List[Dict]:
         logger.debug(f"Retrieved {len(videos)} videos for user {user_id}")
         return videos
         
+    except ValueError:
+        raise
     except Exception as e:
         logger.error(f"Database error for user {user_id}: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail="Error retrieving videos"
         )
+
+def get_video_text(user_id: int, video_id: int) -> Optional[Dict]:
+    """Get the heavy text columns of one of the user's videos, or None if not linked"""
+    return execute_query(f"""
+        SELECT v.id, {", ".join(VIDEO_LIST_FIELDS[f] for f in VIDEO_TEXT_FIELDS)}
+        FROM videos v
+        JOIN user_videos uv ON uv.video_id = v.id
+        WHERE uv.user_id = %s AND v.id = %s
+    """, (user_id, video_id), fetch=True, single=True)
+
 def get_transcript(video_id: int) -> str:
     """Get transcript for a video"""
     result = execute_query(
@@ -204,6 +546,162 @@ def get_transcript(video_id: int) -> str:
     )
     return result["transcript"] if result else ""
 
+# Comment-related functions
+COMMENT_INSERT_PAGE_SIZE = settings.get("COMMENT_INSERT_PAGE_SIZE", 500)  # rows per multi-row INSERT
+
+def get_linked_video(user_id: int, video_id: int) -> Optional[Dict]:
+    """id, TikTok video_id and url of one of the user's videos, or None if not linked"""
+    return execute_query("""
+        SELECT v.id, v.video_id, v.url
+        FROM videos v
+        JOIN user_videos uv ON uv.video_id = v.id
+        WHERE uv.user_id = %s AND v.id = %s
+    """, (user_id, video_id), fetch=True, single=True)
+
+def get_latest_comment_time(video_id: int) -> Optional[int]:
+    """create_time of the newest stored comment on a video: the incremental-fetch cursor"""
+    result = execute_query(
+        "SELECT max(create_time) AS latest FROM comments WHERE video_id = %s",
+        (video_id,),
+        fetch=True,
+        single=True
+    )
+    return result["latest"] if result else None
+
+def add_comments(video_id: int, comments: List[Dict]) -> int:
+    """
+    Insert comments in batched multi-row statements, skipping cids already
+    stored. Returns how many rows were new.
+
+    comments: dicts with cid, author_username, author_nickname, text,
+    digg_count, reply_count and create_time
+    """
+    if not comments:
+        return 0
+    try:
+        with Database() as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                inserted = psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO comments (cid, video_id, author_username, author_nickname, text,
+                                          digg_count, reply_count, create_time)
+                    VALUES %s
+                    ON CONFLICT (cid) DO NOTHING
+                    RETURNING cid
+                    """,
+                    [(c["cid"], video_id, c["author_username"], c["author_nickname"], c["text"],
+                      c["digg_count"], c["reply_count"], c["create_time"]) for c in comments],
+                    page_size=COMMENT_INSERT_PAGE_SIZE,
+                    fetch=True
+                )
+        logger.debug(f"Stored {len(inserted)} of {len(comments)} comments for video {video_id}")
+        return len(inserted)
+    except Exception as e:
+        logger.error(f"Failed to store comments for video {video_id}: {str(e)}")
+        raise
+
+def get_comments_for_video(user_id: int, video_id: int, limit: int,
+                           before: Optional[tuple] = None) -> List[Dict]:
+    """
+    Stored comments on one of the user's videos, newest first.
+
+    Keyset-paginated on (create_time, cid) DESC: pass the last row's
+    (create_time, cid) as before for the next page.
+    """
+    query = """
+        SELECT c.cid, c.author_username, c.author_nickname, c.text,
+               c.digg_count, c.reply_count, c.create_time
+        FROM comments c
+        WHERE c.video_id = %s
+          AND EXISTS (SELECT 1 FROM user_videos uv WHERE uv.user_id = %s AND uv.video_id = %s)
+    """
+    params = [video_id, user_id, video_id]
+    if before is not None:
+        query += " AND (c.create_time, c.cid) < (%s, %s)"
+        params.extend(before)
+    query += " ORDER BY c.create_time DESC, c.cid DESC LIMIT %s"
+    params.append(limit)
+    return execute_query(query, tuple(params), fetch=True)
+
+# Stats refresh functions
+def claim_stats_batch(limit: int, lease_seconds: float) -> List[Dict]:
+    """
+    Claim the videos whose stats are most overdue, pushing their due time out
+    by lease_seconds so concurrent refreshers skip them (and a failed fetch is
+    retried after the lease).
+    """
+    return execute_query("""
+        UPDATE videos v
+        SET stats_due_at = NOW() + %s * INTERVAL '1 second'
+        FROM (
+            SELECT id FROM videos
+            WHERE stats_due_at <= NOW()
+            ORDER BY stats_due_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ) due
+        WHERE v.id = due.id
+        RETURNING v.id, v.url, v.video_playcount,
+                  EXTRACT(EPOCH FROM NOW() - v.created_at) AS age_seconds,
+                  EXTRACT(EPOCH FROM NOW() - COALESCE(v.stats_refreshed_at, v.created_at)) AS since_refresh_seconds
+    """, (lease_seconds, limit), fetch=True, many=True)
+
+def save_video_stats(stats: List[Dict]) -> int:
+    """
+    Write one refresh batch in one transaction: a single UPDATE ... FROM
+    (VALUES ...) for the counters and schedule, and the matching history rows.
+
+    stats: dicts with id, playcount, diggcount, commentcount, sharecount,
+    velocity (plays/hour or None) and next_refresh_seconds
+    """
+    if not stats:
+        return 0
+    try:
+        with Database(autocommit=False) as conn:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    UPDATE videos v
+                    SET video_playcount = s.playcount,
+                        video_diggcount = s.diggcount,
+                        video_commentcount = s.commentcount,
+                        video_sharecount = s.sharecount,
+                        stats_velocity = s.velocity,
+                        stats_refreshed_at = NOW(),
+                        stats_due_at = NOW() + s.next_refresh_seconds * INTERVAL '1 second'
+                    FROM (VALUES %s) AS s(id, playcount, diggcount, commentcount, sharecount, velocity, next_refresh_seconds)
+                    WHERE v.id = s.id
+                    """,
+                    [(s["id"], s["playcount"], s["diggcount"], s["commentcount"], s["sharecount"],
+                      s["velocity"], s["next_refresh_seconds"]) for s in stats],
+                    template="(%s::int, %s::int, %s::int, %s::int, %s::int, %s::float8, %s::float8)",
+                    page_size=len(stats)
+                )
+                psycopg2.extras.execute_values(
+                    cur,
+                    "INSERT INTO video_stats_history (video_id, playcount, diggcount, commentcount, sharecount) VALUES %s",
+                    [(s["id"], s["playcount"], s["diggcount"], s["commentcount"], s["sharecount"]) for s in stats],
+                    page_size=len(stats)
+                )
+        logger.debug(f"Refreshed stats for {len(stats)} videos")
+        return len(stats)
+    except Exception as e:
+        logger.error(f"Failed to save stats for {len(stats)} videos: {str(e)}")
+        raise
+
+def get_video_stats_history(user_id: int, video_id: int, limit: int) -> List[Dict]:
+    """Most recent stats snapshots of one of the user's videos, newest first"""
+    return execute_query("""
+        SELECT h.captured_at, h.playcount, h.diggcount, h.commentcount, h.sharecount
+        FROM video_stats_history h
+        WHERE h.video_id = %s
+          AND EXISTS (SELECT 1 FROM user_videos uv WHERE uv.user_id = %s AND uv.video_id = %s)
+        ORDER BY h.captured_at DESC
+        LIMIT %s
+    """, (video_id, user_id, video_id, limit), fetch=True)
+
 # Highlight-related functions
 def add_highlight(user_id: int, video_id: int, title: str, text: str, color: str, confidence_score: float) -> int:
     """Add a highlight"""
@@ -251,6 +749,52 @@ def delete_highlight(highlight_id: int) -> bool:
         logger.warning(f"Highlight not found for deletion: {highlight_id}")
     return success
 
+async def add_highlight_async(user_id: int, video_id: int, title: str, text: str, color: str, confidence_score: float) -> int:
+    """Add a highlight without blocking the event loop"""
+    result = await async_execute_query(
+        "INSERT INTO highlights (user_id, video_id, title, text, color, confidence_score) VALUES ($1, $2, $3, $4, $5, $6) RETURNING id",
+        user_id, video_id, title, text, color, confidence_score,
+        fetch=True
+    )
+    logger.info(f"Added highlight {result['id']} for video {video_id} with confidence {confidence_score}")
+    return result['id']
+
+async def get_highlights_for_video_async(user_id: int, video_id: int) -> List[Dict]:
+    """Get highlights for a video without blocking the event loop"""
+    highlights = await async_execute_query(
+        "SELECT id, title, text, color, created_at FROM highlights WHERE user_id = $1 AND video_id = $2",
+        user_id, video_id,
+        fetch=True
+    )
+    logger.debug(f"Retrieved {len(highlights)} highlights for video {video_id}")
+    return highlights
+
+async def update_highlight_async(highlight_id: int, title: str, color: str) -> bool:
+    """Update a highlight and mark as user-edited without blocking the event loop"""
+    rows = await async_execute_query(
+        "UPDATE highlights SET title = $1, color = $2, confidence_score = 2.0 WHERE id = $3",
+        title, color, highlight_id
+    )
+    success = rows > 0
+    if success:
+        logger.info(f"Updated highlight {highlight_id} (user-edited, confidence = 2.0)")
+    else:
+        logger.warning(f"Highlight not found for update: {highlight_id}")
+    return success
+
+async def delete_highlight_async(highlight_id: int) -> bool:
+    """Delete a highlight without blocking the event loop"""
+    rows = await async_execute_query(
+        "DELETE FROM highlights WHERE id = $1",
+        highlight_id
+    )
+    success = rows > 0
+    if success:
+        logger.info(f"Deleted highlight {highlight_id}")
+    else:
+        logger.warning(f"Highlight not found for deletion: {highlight_id}")
+    return success
+
 # Collection-related functions
 def create_collection(user_id: int, name: str, color: str = '#3b82f6', icon: str = 'Folder') -> int:
     """Create a new collection"""
@@ -0,0 +1,7 @@
+BEGIN;
+
+-- Per-user progress streams read a user's active and recently finished jobs
+CREATE INDEX IF NOT EXISTS idx_jobs_user_last_updated
+    ON jobs (user_id, last_updated);
+
+COMMIT;
@@ -0,0 +1,8 @@
+BEGIN;
+
+-- Per-stage outputs (file path + metadata, transcript, analysis) so failed
+-- or interrupted imports resume from the last completed stage
+ALTER TABLE jobs
+ADD COLUMN checkpoints JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+COMMIT;
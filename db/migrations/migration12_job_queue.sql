@@ -0,0 +1,20 @@
+BEGIN;
+
+-- Shared import queue for standalone worker processes (IMPORT_MODE = "queue")
+ALTER TABLE jobs
+ADD COLUMN queued BOOLEAN NOT NULL DEFAULT FALSE,
+ADD COLUMN lease_owner TEXT,
+ADD COLUMN lease_expires_at DOUBLE PRECISION,
+ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+
+-- Next job to claim: oldest queued
+CREATE INDEX IF NOT EXISTS idx_jobs_queued
+    ON jobs (created_at)
+    WHERE queued;
+
+-- Expired leases of crashed workers
+CREATE INDEX IF NOT EXISTS idx_jobs_leased
+    ON jobs (lease_expires_at)
+    WHERE lease_owner IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,8 @@
+BEGIN;
+
+-- Set by POST /jobs/{id}/cancel; running imports poll it between chunks
+-- and stop with status 'Cancelled'
+ALTER TABLE jobs
+ADD COLUMN cancel_requested BOOLEAN NOT NULL DEFAULT FALSE;
+
+COMMIT;
@@ -0,0 +1,8 @@
+BEGIN;
+
+-- Per-job measurements reported with the job status (download bytes,
+-- duration, throughput, Range resumes)
+ALTER TABLE jobs
+ADD COLUMN metrics JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+COMMIT;
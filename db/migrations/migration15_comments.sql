@@ -0,0 +1,20 @@
+BEGIN;
+
+-- TikTok comments, one row per cid, ingested incrementally per video
+CREATE TABLE IF NOT EXISTS comments (
+    cid TEXT PRIMARY KEY,
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    author_username TEXT,
+    author_nickname TEXT,
+    text TEXT,
+    digg_count INTEGER,
+    reply_count INTEGER,
+    create_time BIGINT NOT NULL,
+    fetched_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Newest-first pages per video and the incremental-fetch cursor (max create_time)
+CREATE INDEX IF NOT EXISTS idx_comments_video_time
+    ON comments (video_id, create_time DESC, cid DESC);
+
+COMMIT;
@@ -0,0 +1,34 @@
+BEGIN;
+
+-- Engagement stats refresh: import time, last refresh, next due time and
+-- plays/hour since the previous refresh. Existing rows get the migration
+-- time as created_at and are all due immediately.
+ALTER TABLE videos
+ADD COLUMN created_at TIMESTAMP DEFAULT NOW(),
+ADD COLUMN stats_refreshed_at TIMESTAMP,
+ADD COLUMN stats_due_at TIMESTAMP NOT NULL DEFAULT NOW(),
+ADD COLUMN stats_velocity DOUBLE PRECISION;
+
+-- New imports already carry fresh stats: first refresh an hour after import
+ALTER TABLE videos
+ALTER COLUMN stats_due_at SET DEFAULT NOW() + INTERVAL '1 hour';
+
+-- Next refresh batch: earliest due first
+CREATE INDEX IF NOT EXISTS idx_videos_stats_due
+    ON videos (stats_due_at);
+
+-- One row per video per refresh, for growth rates over time
+CREATE TABLE IF NOT EXISTS video_stats_history (
+    id BIGSERIAL PRIMARY KEY,
+    video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+    captured_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    playcount INTEGER,
+    diggcount INTEGER,
+    commentcount INTEGER,
+    sharecount INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_stats_history_video
+    ON video_stats_history (video_id, captured_at DESC);
+
+COMMIT;
@@ -0,0 +1,12 @@
+BEGIN;
+
+-- Other users who asked for the same video while its import was in flight;
+-- they follow the job's progress and are linked to the video when it is saved
+ALTER TABLE jobs
+ADD COLUMN watchers INTEGER[] NOT NULL DEFAULT '{}';
+
+-- Progress streams of watching users: watchers @> ARRAY[user_id]
+CREATE INDEX IF NOT EXISTS idx_jobs_watchers
+    ON jobs USING GIN (watchers);
+
+COMMIT;
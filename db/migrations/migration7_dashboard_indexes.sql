@@ -0,0 +1,22 @@
+-- Migration 7: indexes for the per-user dashboard filters.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so this
+-- file has no BEGIN/COMMIT and every statement is idempotent.
+--
+-- Already covered by existing UNIQUE constraints (leading column), no new index needed:
+--   user_videos(user_id)            -> UNIQUE(user_id, video_id)
+--   collection_videos(collection_id)-> UNIQUE(collection_id, video_id)
+--   collections(user_id)            -> UNIQUE(user_id, name)
+
+-- get_highlights_for_video: WHERE user_id = ? AND video_id = ?
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_highlights_user_video
+    ON highlights (user_id, video_id);
+
+-- Reverse lookups from a video (FK checks when videos are deleted, "who owns this video")
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_highlights_video
+    ON highlights (video_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_videos_video
+    ON user_videos (video_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_collection_videos_video
+    ON collection_videos (video_id);
@@ -0,0 +1,20 @@
+BEGIN;
+
+-- Import job state shared by all API workers (JOB_STORE = "postgres")
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress INTEGER DEFAULT 0,
+    message TEXT,
+    user_id INTEGER REFERENCES users(id),
+    created_at DOUBLE PRECISION NOT NULL,
+    last_updated DOUBLE PRECISION NOT NULL
+);
+
+-- Resuming stale jobs only looks at unfinished ones
+CREATE INDEX IF NOT EXISTS idx_jobs_unfinished
+    ON jobs (last_updated)
+    WHERE status NOT IN ('Completed', 'Failed');
+
+COMMIT;
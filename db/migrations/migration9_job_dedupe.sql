@@ -0,0 +1,30 @@
+BEGIN;
+
+-- O(1) lookup of the in-flight job for a URL, and TTL eviction of finished jobs
+ALTER TABLE jobs
+ADD COLUMN dedupe_key TEXT,
+ADD COLUMN active BOOLEAN NOT NULL DEFAULT TRUE;
+
+UPDATE jobs
+SET dedupe_key = url,
+    active = status NOT IN ('Completed', 'Failed');
+
+ALTER TABLE jobs
+ALTER COLUMN dedupe_key SET NOT NULL;
+
+-- At most one unfinished job per key; also backs INSERT ... ON CONFLICT
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_dedupe_key
+    ON jobs (dedupe_key)
+    WHERE active;
+
+DROP INDEX IF EXISTS idx_jobs_unfinished;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_active_last_updated
+    ON jobs (last_updated)
+    WHERE active;
+
+CREATE INDEX IF NOT EXISTS idx_jobs_finished_last_updated
+    ON jobs (last_updated)
+    WHERE NOT active;
+
+COMMIT;
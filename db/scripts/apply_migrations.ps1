@@ -79,4 +79,70 @@ if ($LASTEXITCODE -ne 0){
     Write-Error "migration6 failed"
     exit 1
 }
+Write-Output "Running migration7 (dashboard indexes)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration7_dashboard_indexes.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration7 failed"
+    exit 1
+}
+Write-Output "Running migration8 (jobs)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration8_jobs.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration8 failed"
+    exit 1
+}
+Write-Output "Running migration9 (job dedupe and eviction)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration9_job_dedupe.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration9 failed"
+    exit 1
+}
+Write-Output "Running migration10 (job user index)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration10_job_user_index.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration10 failed"
+    exit 1
+}
+Write-Output "Running migration11 (job checkpoints)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration11_job_checkpoints.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration11 failed"
+    exit 1
+}
+Write-Output "Running migration12 (job queue)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration12_job_queue.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration12 failed"
+    exit 1
+}
+Write-Output "Running migration13 (job cancellation)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration13_job_cancel.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration13 failed"
+    exit 1
+}
+Write-Output "Running migration14 (job metrics)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration14_job_metrics.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration14 failed"
+    exit 1
+}
+Write-Output "Running migration15 (comments)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration15_comments.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration15 failed"
+    exit 1
+}
+Write-Output "Running migration16 (video stats refresh)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration16_video_stats.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration16 failed"
+    exit 1
+}
+Write-Output "Running migration17 (job watchers)..."
+psql -h localhost -U tiktok_user -d tiktok_processor -f "../migrations/migration17_job_watchers.sql"
+if ($LASTEXITCODE -ne 0){
+    Write-Error "migration17 failed"
+    exit 1
+}
 Write-Output "All migrations applied successfully."
@@ -1,6 +1,6 @@
 import time
 import os
-import pandas as pd
+import threading
 import requests
 from utils.utils import get_settings, get_logger
 import utils.pyktok_patch
@@ -9,85 +9,154 @@ import utils.pyktok_patch
 settings = get_settings()
 logger = get_logger(settings.LOGS_PATH)
 
-def download_video(url, save_dir='videos'):
+# Optional append-only metadata log in the save dir for offline analysis ("" disables it).
+# A .jsonl name appends one line per video; a .csv name uses pyktok's rewrite-everything CSV.
+METADATA_LOG = settings.get("DOWNLOAD_METADATA_LOG", "")
+PROXY_HEALTH_TTL = settings.get("PROXY_HEALTH_TTL", 60)  # seconds between background proxy checks
+
+class ProxyHealthCheck:
+    """Cached proxy health, refreshed by a background thread every ttl seconds.
+
+    Only the first call (or one after the checker has fallen behind by two
+    TTLs) probes inline; downloads otherwise read the cached result.
+    """
+    def __init__(self, proxies, ttl, timeout):
+        self.proxies = proxies
+        self.ttl = ttl
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._healthy = None
+        self._error = None
+        self._checked_at = 0.0
+        self._thread = None
+
+    def _probe(self):
+        try:
+            response = utils.pyktok_patch.get_session(self.proxies).get("https://ipv4.icanhazip.com", timeout=self.timeout)
+            response.raise_for_status()
+            logger.debug(f"Proxy test successful. Current IP: {response.text.strip()}")
+            healthy, error = True, None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Proxy test failed: {str(e)}")
+            healthy, error = False, str(e)
+        with self._lock:
+            self._healthy, self._error, self._checked_at = healthy, error, time.time()
+
+    def _run(self):
+        while True:
+            time.sleep(self.ttl)
+            self._probe()
+
+    def check(self):
+        """Raise ConnectionError if the proxy was unhealthy at its last check"""
+        with self._lock:
+            stale = time.time() - self._checked_at > 2 * self.ttl
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="proxy-health", daemon=True)
+                self._thread.start()
+        if stale:
+            self._probe()
+        with self._lock:
+            if not self._healthy:
+                raise ConnectionError(f"Proxy connection failed: {self._error}")
+
+_proxy_checks = {}
+_proxy_checks_lock = threading.Lock()
+
+def get_proxy_check(proxy, proxies):
+    with _proxy_checks_lock:
+        if proxy not in _proxy_checks:
+            logger.info(f"Starting background health checks for proxy {proxy}")
+            _proxy_checks[proxy] = ProxyHealthCheck(proxies, PROXY_HEALTH_TTL, settings.get('PROXY_TIMEOUT', 10))
+        return _proxy_checks[proxy]
+
+def get_proxies():
+    """requests proxies for the configured download proxy, or None"""
+    proxy = settings.get('PROXY')
+    proxy_auth = settings.get('PROXY_AUTH')
+    return {"https": f"http://{proxy_auth}@{proxy}"} if proxy and proxy_auth else None
+
+def egress_key():
+    """Rate-limiter key for downloads made by download_video"""
+    return utils.pyktok_patch.egress_key(get_proxies())
+
+def resolve_video(url):
+    """(TikTok video id, url) for a post link, following short-link redirects through the proxy"""
+    return utils.pyktok_patch.resolve_video_url(url, proxies=get_proxies())
+
+def video_path(video_id, save_dir='videos'):
+    """Where the video with this TikTok id is stored"""
+    return os.path.join(save_dir, f"{video_id}.mp4")
+
+def download_video(url, save_dir='videos', cancel_check=None, progress_callback=None, rate_limit=True, video_id=None):
     """
     Download a TikTok video and its metadata using pyktok with proxy support.
     
     Args:
         url (str): TikTok video URL
         save_dir (str): Directory to save the video and metadata
+        cancel_check (callable): Called between downloaded chunks; raises to abort
+        progress_callback (callable): Receives byte/throughput stats while downloading
+        rate_limit (bool): Wait for the shared TikTok rate limiter; pass False when the
+            caller has already reserved a slot
+        video_id (str): TikTok video id; the file is stored as <video_id>.mp4 and an
+            existing complete file is reused (only the metadata is fetched)
         
     Returns:
-        tuple: (video_file_path, metadata_dict)
+        tuple: (video_file_path, VideoMetadata)
     """
     try:
         # Configure proxy from settings
         proxy = settings.get('PROXY')
-        proxy_auth = settings.get('PROXY_AUTH')
-        
-        proxies = {
-            "https": f"http://{proxy_auth}@{proxy}"
-        } if proxy and proxy_auth else None
+        proxies = get_proxies()
 
-        # Test proxy connection
+        # Cached proxy health; refreshed in the background rather than probed per download
         if proxies:
-            logger.info(f"Testing proxy connection to {proxy}")
-            try:
-                response = requests.get("https://ipv4.icanhazip.com", 
-                                     proxies=proxies, 
-                                     timeout=settings.get('PROXY_TIMEOUT', 10))
-                logger.debug(f"Proxy test successful. Current IP: {response.text.strip()}")
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Proxy test failed: {str(e)}")
-                raise ConnectionError("Proxy connection failed")
+            get_proxy_check(proxy, proxies).check()
 
         # Ensure save directory exists
         os.makedirs(save_dir, exist_ok=True)
         logger.info(f"Downloading TikTok video from {url}")
         logger.debug(f"Save directory: {save_dir}")
 
+        stored = video_path(video_id, save_dir) if video_id else None
+        reuse = stored is not None and os.path.exists(stored) and os.path.getsize(stored) >= 1000
+        if reuse:
+            logger.info(f"Reusing stored file {stored}, fetching metadata only")
+
         # Download video and metadata
         result = utils.pyktok_patch.save_tiktok(
             url,
-            save_video=True,
-            metadata_fn="tiktok_data.csv",
+            save_video=not reuse,
+            metadata_fn=METADATA_LOG,
             save_dir=save_dir,
-            proxies=proxies
+            proxies=proxies,
+            cancel_check=cancel_check,
+            progress_callback=progress_callback,
+            rate_limit=rate_limit,
+            file_stem=video_id
         )
 
-        # Rate limiting
-        sleep_time = settings.get('DOWNLOAD_DELAY', 1)
-        logger.debug(f"Sleeping for {sleep_time} seconds between downloads")
-        time.sleep(sleep_time)
-
-        # Find downloaded video file
-        files = [
-            os.path.join(save_dir, f)
-            for f in os.listdir(save_dir)
-            if f.endswith('.mp4')
-        ]
-        
-        if not files:
-            error_msg = f"No .mp4 files found in {save_dir}"
+        video_file = stored if reuse else result['video_fn']
+        if not video_file:
+            error_msg = f"No video file downloaded for {url} (photo post?)"
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
-        
-        latest_file = max(files, key=os.path.getctime)
-        logger.info(f"Downloaded video saved to: {latest_file}")
+        logger.info(f"Downloaded video saved to: {video_file}")
+        metadata = result['metadata']
+        logger.debug("Retrieved video metadata", extra={"metadata": metadata.to_dict()})
 
-        # Get metadata
-        metadata_path = os.path.join(save_dir, "tiktok_data.csv")
-        if not os.path.exists(metadata_path):
-            error_msg = f"Metadata file not found at {metadata_path}"
-            logger.error(error_msg)
-            raise FileNotFoundError(error_msg)
-
-        metadata_df = pd.read_csv(metadata_path)
-        last_metadata = metadata_df.iloc[-1].to_dict()
-        logger.debug("Retrieved video metadata", extra={"metadata": last_metadata})
-
-        return latest_file, last_metadata
+        return video_file, metadata
 
     except Exception as e:
         logger.error(f"Failed to download video from {url}: {str(e)}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+
+def fetch_metadata(url, rate_limit=True):
+    """Fetch a TikTok post's current VideoMetadata without downloading the video"""
+    proxies = get_proxies()
+    if proxies:
+        get_proxy_check(settings.get('PROXY'), proxies).check()
+    result = utils.pyktok_patch.save_tiktok(url, save_video=False, proxies=proxies, rate_limit=rate_limit)
+    return result['metadata']
@@ -0,0 +1,397 @@
+import json
+import os
+import re
+import time
+import download
+import transcribe
+import db
+from openai import OpenAI
+from create_vector_db import add_new_transcript
+from jobs_progress import get_job, update_job_progress, update_job_metrics, save_checkpoint, get_checkpoints, CancelToken, JobCancelled
+from pipeline import Defer, Pipeline, Stage
+from utils.pyktok_patch import extract_video_id
+from utils.rate_limit import tiktok_limiter
+from utils.video_metadata import VideoMetadata
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+client = OpenAI(api_key=settings.OPENAI_API_KEY)
+
+MAX_RETRIES = 3
+
+# Per-stage concurrency and queue bounds, tuned per resource:
+# download = network, media = CPU (ffmpeg), transcribe/analyze/save = OpenAI API + DB
+STAGE_DEFAULTS = {
+    # Kept short: waiting imports queue in the fair scheduler, not here
+    "download": {"workers": 8, "queue": 8},
+    "media": {"workers": os.cpu_count() or 2, "queue": 20},
+    "transcribe": {"workers": 6, "queue": 20},
+    "analyze": {"workers": 6, "queue": 20},
+    "save": {"workers": 4, "queue": 20},
+}
+
+ANALYSIS_PROMPT = """
+You are a content summarizer for short videos. Given the transcript below, produce:
+
+1. A concise 2-3 sentence summary of what the video is about.
+2. A list of 10 relevant tags (hashtags or keywords) describing the video content with the "#" format.
+3. Identify only 1 best hooks from the transcript of the video with hook title and hook text. and also rank the confidence score of the hooks from 0-1)
+4. Classify the style of the video by analyzing, what category/niche it belongs , from the following provided:
+{{1: Voice-over
+-------------
+Narration explaining visuals or storytelling.
+Used for tutorials, behind-the-scenes, etc.
+
+2: Talking Head
+---------------
+Person speaking directly to the camera.
+Often includes opinions, advice, or promotional content.
+
+3: Podcast
+----------
+Conversational or interview-style format.
+Includes back-and-forth dialogue or monologues.
+
+4: Educational
+--------------
+Step-by-step guides or knowledge-based explanations.
+Uses clear structure like “Step 1... Step 2...” or “Here’s how…”
+
+5: Storytime
+------------
+Personal narratives, often starting with a hook.
+Structured in beginning–middle–end format.
+
+4: Commentary
+-------------
+Creator gives opinion on a topic or video.
+Often includes phrases like “Let’s talk about…” or “Here’s what I think…”
+
+5: Listicle
+-----------
+Structured as “Top 5 tips…” or “3 things you didn’t know…”
+Uses numbered sections or predictable format.
+
+6: Motivational
+---------------
+Uplifting speeches or affirmations.
+Format: “You are capable of…” or “Don’t give up…”
+
+7: Promotional
+--------------
+Clear CTA, product/service mention, benefit-focused.
+Format: “Introducing…”, “You need this because…”}}
+
+Transcript:
+{transcript}
+
+Return your response in dict format:
+  {{"summary": "video-summary",
+  "tags": ["tag1", "tag2"],
+  "hooks":{{
+      "hook-title":["title1","title2"],
+      "hook-text":["tex1","text2"],
+      "confidence-score":["score1","score2","score3"]}}
+  }},
+  Niche:"video-niche" """
+
+# Keys of the analysis the save stage reads
+ANALYSIS_KEYS = {"summary", "tags", "Niche", "hooks"}
+
+def new_import(job_id: str, user_id: int, url: str) -> dict:
+    """Context passed from stage to stage for one import job"""
+    return {"job_id": job_id, "user_id": user_id, "url": url, "tiktok_id": extract_video_id(url),
+            "cancel": CancelToken(job_id)}
+
+def job_watchers(job_id: str) -> list:
+    """Users other than the owner waiting on this job's video"""
+    job = get_job(job_id)
+    return list(job.get("watchers") or []) if job else []
+
+# Stage to start at when a checkpoint exists, newest checkpoint first
+RESUME_POINTS = [
+    ("analyze", "save"),
+    ("transcribe", "analyze"),
+    ("download", "media"),
+]
+
+def resume_import(job_id: str, user_id: int, url: str):
+    """
+    Rebuild an import context from the job's checkpoints.
+
+    Returns (ctx, stage to start at). A download checkpoint whose file has
+    since disappeared is ignored, which sends the job back to the download.
+    """
+    ctx = new_import(job_id, user_id, url)
+    checkpoints = get_checkpoints(job_id)
+    download_state = checkpoints.get("download")
+    if not download_state or not os.path.exists(download_state["file_path"]):
+        return ctx, "download"
+    for checkpoint, start_at in RESUME_POINTS:
+        if checkpoint in checkpoints:
+            for data in checkpoints.values():
+                ctx.update(data)
+            ctx["metadata"] = VideoMetadata.from_dict(ctx["metadata"])
+            logger.info(f"Resuming job {job_id} at stage '{start_at}' from checkpoint")
+            return ctx, start_at
+    return ctx, "download"
+
+def download_progress(job_id: str):
+    """progress_callback for download.download_video: live progress, then metrics on the job"""
+    def report(stats):
+        if stats["done"]:
+            update_job_metrics(job_id, {
+                "download_bytes": stats["bytes"],
+                "download_seconds": stats["seconds"],
+                "download_bytes_per_second": stats["bytes_per_second"],
+                "download_resumes": stats["resumes"],
+            })
+            return
+        mb, rate = stats["bytes"] / 1e6, stats["bytes_per_second"] / 1e6
+        if stats["total_bytes"]:
+            progress = 15 + int(15 * stats["bytes"] / stats["total_bytes"])
+            message = f"Downloaded {mb:.1f} of {stats['total_bytes'] / 1e6:.1f} MB ({rate:.1f} MB/s)"
+        else:
+            progress, message = 15, f"Downloaded {mb:.1f} MB ({rate:.1f} MB/s)"
+        update_job_progress(job_id, "Downloading", progress, message)
+    return report
+
+def transcribe_progress(job_id: str):
+    """progress_callback for transcribe.transcribe_chunks: per-chunk progress, then latencies on the job"""
+    def report(stats):
+        if stats["done"]:
+            update_job_metrics(job_id, {
+                "transcribe_chunks": stats["chunks_total"],
+                "transcribe_seconds": stats["seconds"],
+                "transcribe_chunk_seconds": stats["chunk_seconds"],
+                "transcribe_chunk_retries": stats["retries"],
+                "transcribe_chunks_failed": stats["failed"],
+            })
+            return
+        progress = 45 + int(20 * stats["chunks_done"] / stats["chunks_total"])
+        if stats["chunk_seconds"] is None:
+            message = f"Chunk {stats['chunks_done']} of {stats['chunks_total']} failed after {stats['attempts']} attempts"
+        else:
+            message = f"Transcribed chunk {stats['chunks_done']} of {stats['chunks_total']} ({stats['chunk_seconds']:.1f}s)"
+        update_job_progress(job_id, "Transcribing", progress, message)
+    return report
+
+def download_stage(ctx: dict):
+    job_id, user_id, url = ctx["job_id"], ctx["user_id"], ctx["url"]
+    ctx["cancel"].check()
+    update_job_progress(job_id, "Downloading", 10, "Starting download")
+    logger.info(f"Starting download for URL: {url}")
+    
+    # Keyed by TikTok id, so any link to an imported video matches (URLs from before resolution fall back to the URL)
+    existing = db.get_video_by_tiktok_id(ctx["tiktok_id"]) if ctx["tiktok_id"] else db.get_video_by_url(url)
+    if existing:
+        linked = [user_id] + job_watchers(job_id)
+        for uid in linked:
+            db.link_user_video(uid, existing["id"])
+        update_job_progress(job_id, "Completed", 100, "Video already existed - linked to account")
+        for uid in set(job_watchers(job_id)) - set(linked):
+            db.link_user_video(uid, existing["id"])
+        logger.info(f"Video already exists, linked to user: {url}")
+        return None
+
+    # Take a rate-limiter slot; if it isn't due yet, wait on the pipeline timer rather than a worker
+    if not ctx.pop("rate_reserved", False):
+        delay = tiktok_limiter.reserve(download.egress_key())
+        if delay > 0:
+            ctx["rate_reserved"] = True
+            update_job_progress(job_id, "Downloading", 10, f"Waiting {delay:.0f}s for the TikTok rate limit")
+            return Defer(ctx, delay)
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            update_job_progress(job_id, "Downloading", 15 + attempt*5, f"Download attempt {attempt+1}")
+            # The first attempt uses the slot reserved above; retries wait for their own
+            file_path, metadata = download.download_video(
+                url, cancel_check=ctx["cancel"], progress_callback=download_progress(job_id), rate_limit=attempt > 0,
+                video_id=ctx["tiktok_id"]
+            )
+            if not os.path.exists(file_path) or os.path.getsize(file_path) < 1000:
+                raise Exception("Download failed or returned small file")
+            break
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"[Download Retry {attempt+1}] Error: {e}")
+    else:
+        error_msg = "Failed to download video after retries"
+        update_job_progress(job_id, "Failed", 0, error_msg)
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    ctx["file_path"], ctx["metadata"] = file_path, metadata
+    save_checkpoint(job_id, "download", {"file_path": file_path, "metadata": metadata.to_dict()})
+    return ctx
+
+def media_stage(ctx: dict):
+    job_id = ctx["job_id"]
+    ctx["cancel"].check()
+    update_job_progress(job_id, "Transcribing", 35, "Extracting audio")
+    logger.info(f"Extracting audio for URL: {ctx['url']}")
+    for attempt in range(MAX_RETRIES):
+        try:
+            ctx["audio_path"], ctx["chunks"] = transcribe.prepare_audio_chunks(ctx["file_path"])
+            break
+        except Exception as e:
+            logger.warning(f"[Audio Retry {attempt+1}] Error: {e}")
+    else:
+        error_msg = "Failed to extract audio after retries"
+        logger.error(error_msg)
+        update_job_progress(job_id, "Failed", 35, error_msg)
+        raise Exception(error_msg)
+    return ctx
+
+def transcribe_stage(ctx: dict):
+    job_id = ctx["job_id"]
+    ctx["cancel"].check()
+    update_job_progress(job_id, "Transcribing", 40, "Starting transcription")
+    logger.info(f"Starting transcription for URL: {ctx['url']}")
+    try:
+        # Each chunk is retried on its own; re-running the whole set would pay again for the ones that worked
+        transcript = transcribe.transcribe_chunks(
+            ctx["chunks"], cancel_check=ctx["cancel"], progress_callback=transcribe_progress(job_id)
+        )
+        if transcript.strip() == "":
+            error_msg = "Failed to transcribe video: no chunk produced any text"
+            logger.error(error_msg)
+            update_job_progress(job_id, "Failed", 40, error_msg)
+            raise Exception(error_msg)
+    finally:
+        transcribe.cleanup_audio_files(ctx.pop("audio_path"), ctx.pop("chunks"))
+    ctx["transcript"] = transcript
+    save_checkpoint(job_id, "transcribe", {"transcript": transcript})
+    return ctx
+
+def analyze_stage(ctx: dict):
+    job_id = ctx["job_id"]
+    update_job_progress(job_id, "Analyzing", 70, "Generating summary and tags")
+    prompt = ANALYSIS_PROMPT.format(transcript=ctx["transcript"])
+    for attempt in range(MAX_RETRIES):
+        # Don't spend an LLM call on a cancelled job
+        ctx["cancel"].check()
+        try:
+            update_job_progress(job_id, "Analyzing", 75 + attempt*5, f"Analysis attempt {attempt+1}")
+
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You summarize TikTok transcripts into 2-3 lines."},
+                    {"role": "user", "content": prompt}
+                ],
+            )
+            response = response.choices[0].message.content.strip()
+            response = re.search(r'```json(.*?)```', response, re.DOTALL)
+            response = response.group(1).strip()
+            logger.debug(f"GPT response: {response}")
+            data = json.loads(response)
+            # Fail the attempt now rather than in the save stage if a key is missing
+            missing = ANALYSIS_KEYS - data.keys()
+            if missing:
+                raise ValueError(f"Analysis is missing keys: {', '.join(sorted(missing))}")
+            break
+        except Exception as e:
+            logger.warning(f"[Summary Retry {attempt+1}] Error: {e}")
+    else:
+        error_msg = "Failed to get summary after retries"
+        update_job_progress(job_id, "Failed", 70, error_msg)
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    ctx["analysis"] = data
+    save_checkpoint(job_id, "analyze", {"analysis": data})
+    return ctx
+
+def save_stage(ctx: dict):
+    job_id, user_id, url = ctx["job_id"], ctx["user_id"], ctx["url"]
+    data = ctx["analysis"]
+    ctx["cancel"].check()
+    update_job_progress(job_id, "Saving", 90, "Saving video data")
+    highlights = [
+        (title, text, "yellow", float(score))
+        for title, text, score in zip(
+            data["hooks"]["hook-title"],
+            data["hooks"]["hook-text"],
+            data["hooks"]["confidence-score"]
+        )
+    ]
+    watchers = job_watchers(job_id)
+    video_id = db.save_processed_video(
+        user_id, url, ctx["file_path"], ctx["transcript"], ctx["metadata"],
+        summary=data["summary"], tags=data["tags"], niche=data["Niche"], highlights=highlights,
+        watchers=watchers
+    )
+    logger.info(f"Successfully saved video record for URL: {url}")
+    add_new_transcript(ctx["transcript"], video_id)
+    logger.info(f"Added transcript to vector DB for video ID: {video_id}")
+    update_job_progress(job_id, "Completed", 100, "Video processing completed")
+    # Users who joined between the save and completion; later ones find the saved video themselves
+    for uid in set(job_watchers(job_id)) - set(watchers):
+        db.link_user_video(uid, video_id)
+    logger.info(f"Video processing completed for URL: {url}")
+    return ctx
+
+STAGES = [
+    ("download", download_stage),
+    ("media", media_stage),
+    ("transcribe", transcribe_stage),
+    ("analyze", analyze_stage),
+    ("save", save_stage),
+]
+
+def cleanup_cancelled_import(ctx: dict):
+    """Remove the temp audio and the downloaded video of an import that will not be saved"""
+    if "audio_path" in ctx:
+        transcribe.cleanup_audio_files(ctx.pop("audio_path"), ctx.pop("chunks", []))
+    file_path = ctx.pop("file_path", None)
+    if file_path and os.path.exists(file_path):
+        os.remove(file_path)
+        logger.debug(f"Removed downloaded video of cancelled import: {file_path}")
+
+def handle_import_error(ctx: dict, error: Exception):
+    if isinstance(error, JobCancelled):
+        logger.info(f"Import cancelled for URL: {ctx['url']}")
+        try:
+            cleanup_cancelled_import(ctx)
+        finally:
+            update_job_progress(ctx["job_id"], "Cancelled", 0, "Import cancelled")
+        return
+    error_msg = f"Failed to process video {ctx['url']}: {str(error)}"
+    logger.error(error_msg)
+    update_job_progress(ctx["job_id"], "Failed", 0, error_msg)
+
+def build_import_pipeline(on_done=None) -> Pipeline:
+    """Import pipeline with stage sizes from PIPELINE_<STAGE>_WORKERS / PIPELINE_<STAGE>_QUEUE"""
+    stages = []
+    for name, handler in STAGES:
+        defaults = STAGE_DEFAULTS[name]
+        stages.append(Stage(
+            name,
+            handler,
+            workers=int(settings.get(f"PIPELINE_{name.upper()}_WORKERS", defaults["workers"])),
+            queue_size=int(settings.get(f"PIPELINE_{name.upper()}_QUEUE", defaults["queue"])),
+        ))
+    return Pipeline(stages, on_error=handle_import_error, on_done=on_done)
+
+def run_stages(ctx: dict, start_at: str = "download"):
+    """Run the stages from start_at onwards in the calling thread; stage errors propagate"""
+    names = [name for name, _ in STAGES]
+    for _, handler in STAGES[names.index(start_at):]:
+        ctx = handler(ctx)
+        # No pipeline timer here: a deferred stage just waits in this thread
+        while isinstance(ctx, Defer):
+            time.sleep(ctx.delay)
+            ctx = handler(ctx.item)
+        if ctx is None:
+            return
+
+def run_import(ctx: dict, start_at: str = "download"):
+    """Run the stages from start_at onwards in the calling thread (no pipeline queues)"""
+    try:
+        run_stages(ctx, start_at)
+    except Exception as e:
+        handle_import_error(ctx, e)
@@ -1,42 +1,740 @@
+from collections import OrderedDict
 from threading import Lock
-from typing import Dict, Any
-import time,uuid
-# Global state with lock
-_video_jobs: Dict[str, Dict[str, Any]] = {}
-_video_jobs_lock = Lock()
+from typing import Dict, Any, List, Optional, Set, Tuple
+import asyncio
+import json,time,uuid
+import psycopg2
+import db
+from utils.utils import get_settings, get_logger
+
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+# "memory" keeps jobs in this process only (tests, single worker);
+# "postgres" shares them across API workers and survives restarts
+JOB_STORE = settings.get("JOB_STORE", "memory")
+TERMINAL_STATUSES = ("Completed", "Failed", "Cancelled")
+# Finished jobs are kept this long so clients can read their final status, then evicted
+JOB_TTL_SECONDS = settings.get("JOB_TTL_SECONDS", 3600)
+# Upper bound on finished jobs retained by the in-memory store, whatever their age
+MAX_RETAINED_JOBS = settings.get("MAX_RETAINED_JOBS", 10000)
+# The Postgres store sweeps finished jobs at most this often
+JOB_EVICTION_INTERVAL = settings.get("JOB_EVICTION_INTERVAL", 60)
+# Finished jobs still reported to a user's progress stream for this long
+RECENT_JOB_WINDOW = settings.get("RECENT_JOB_WINDOW", 300)
+# Running imports look up their cancel flag at most this often
+CANCEL_CHECK_INTERVAL = settings.get("CANCEL_CHECK_INTERVAL", 1)
+
+def _new_job(url: str, user_id: int) -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "url": url,
+        "status": "Queued",
+        "progress": 0,
+        "message": "Waiting to start processing",
+        "user_id": user_id,
+        "watchers": [],
+        "created_at": now,
+        "last_updated": now
+    }
+
+class InMemoryJobStore:
+    """Jobs in a dict guarded by a lock; lost on restart
+
+    Active jobs are indexed by dedupe key for O(1) lookups. Finished jobs are
+    kept in completion order and evicted after JOB_TTL_SECONDS, or earlier
+    once more than MAX_RETAINED_JOBS have piled up.
+    """
+    def __init__(self, ttl: float = JOB_TTL_SECONDS, max_retained: int = MAX_RETAINED_JOBS):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._active_by_key: Dict[str, str] = {}
+        self._by_user: Dict[int, Set[str]] = {}
+        self._finished: "OrderedDict[str, float]" = OrderedDict()  # job_id -> finished at
+        self._ttl = ttl
+        self._max_retained = max_retained
+        self._evicted = 0
+        self._lock = Lock()
+
+    def _evict_locked(self, now: float):
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at >= now - self._ttl and len(self._finished) <= self._max_retained:
+                break
+            self._finished.popitem(last=False)
+            _forget_published([job_id])
+            job = self._jobs.pop(job_id, None)
+            if job is not None:
+                for user_id in [job["user_id"]] + job["watchers"]:
+                    user_jobs = self._by_user.get(user_id)
+                    if user_jobs is not None:
+                        user_jobs.discard(job_id)
+                        if not user_jobs:
+                            del self._by_user[user_id]
+            self._evicted += 1
+
+    def _create_locked(self, url: str, user_id: int, key: str) -> str:
+        job_id = str(uuid.uuid4())
+        job = _new_job(url, user_id)
+        job["dedupe_key"] = key
+        self._jobs[job_id] = job
+        self._active_by_key[key] = job_id
+        self._by_user.setdefault(user_id, set()).add(job_id)
+        self._evict_locked(job["created_at"])
+        return job_id
+
+    def create_job(self, url: str, user_id: int) -> str:
+        with self._lock:
+            return self._create_locked(url, user_id, url)
+
+    def get_or_create_job(self, url: str, user_id: int, key: str) -> Tuple[str, Dict[str, Any], bool]:
+        with self._lock:
+            job_id = self._active_by_key.get(key)
+            if job_id is not None:
+                return job_id, dict(self._jobs[job_id]), False
+            job_id = self._create_locked(url, user_id, key)
+            return job_id, dict(self._jobs[job_id]), True
+
+    def add_job_watcher(self, job_id: str, user_id: int) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return False
+            if user_id != job["user_id"] and user_id not in job["watchers"]:
+                job["watchers"] = job["watchers"] + [user_id]
+                self._by_user.setdefault(user_id, set()).add(job_id)
+            return True
+
+    def remove_job_watcher(self, job_id: str, user_id: int) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or user_id not in job["watchers"]:
+                return False
+            job["watchers"] = [uid for uid in job["watchers"] if uid != user_id]
+            user_jobs = self._by_user.get(user_id)
+            if user_jobs is not None:
+                user_jobs.discard(job_id)
+                if not user_jobs:
+                    del self._by_user[user_id]
+            return True
+
+    def find_active_job(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            job_id = self._active_by_key.get(key)
+            return (job_id, dict(self._jobs[job_id])) if job_id is not None else None
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {job_id: dict(self._jobs[job_id]) for job_id in job_ids if job_id in self._jobs}
+
+    def get_jobs_for_user(self, user_id: int, since: float) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            jobs = {}
+            for job_id in self._by_user.get(user_id, ()):
+                job = self._jobs[job_id]
+                if job["status"] not in TERMINAL_STATUSES or job["last_updated"] >= since:
+                    jobs[job_id] = dict(job)
+            return jobs
+
+    def update_job_progress(self, job_id: str, status: str, progress: int, message: str = "") -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            now = time.time()
+            job.update({
+                "status": status,
+                "progress": progress,
+                "message": message,
+                "last_updated": now
+            })
+            if status in TERMINAL_STATUSES:
+                job.pop("cancel_requested", None)
+                if self._active_by_key.get(job["dedupe_key"]) == job_id:
+                    del self._active_by_key[job["dedupe_key"]]
+                self._finished[job_id] = now
+                self._finished.move_to_end(job_id)
+                self._evict_locked(now)
+            elif job_id in self._finished:
+                # Revived (e.g. retried) jobs become active again
+                del self._finished[job_id]
+                self._active_by_key.setdefault(job["dedupe_key"], job_id)
+            return dict(job)
+
+    def reactivate_failed_job(self, job_id: str, message: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != "Failed" or job["dedupe_key"] in self._active_by_key:
+                return None
+            self._finished.pop(job_id, None)
+            self._active_by_key[job["dedupe_key"]] = job_id
+            job.update({"status": "Queued", "message": message, "last_updated": time.time()})
+            return dict(job)
+
+    def get_all_jobs(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {job_id: dict(job) for job_id, job in self._jobs.items()}
+
+    def save_checkpoint(self, job_id: str, stage: str, data: Dict[str, Any]):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].setdefault("checkpoints", {})[stage] = data
+
+    def get_checkpoints(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job.get("checkpoints", {})) if job else {}
+
+    def request_cancel(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return False
+            job["cancel_requested"] = True
+            return True
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return bool(job and job.get("cancel_requested"))
+
+    def update_job_metrics(self, job_id: str, metrics: Dict[str, Any]):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].setdefault("metrics", {}).update(metrics)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "retained": len(self._jobs),
+                "active": len(self._active_by_key),
+                "finished": len(self._finished),
+                "evicted": self._evicted,
+            }
+
+    def claim_stale_jobs(self, stale_after: float, owner: str, lease_seconds: float) -> List[Tuple[str, Dict[str, Any]]]:
+        # Nothing outlives the process, so there is never anything to resume
+        return []
+
+    # ...and no other process that could take a job over
+    def lease_local_job(self, job_id: str, owner: str, lease_seconds: float):
+        pass
+
+    def renew_local_leases(self, owner: str, lease_seconds: float) -> int:
+        return 0
+
+class PostgresJobStore:
+    """Jobs in the jobs table, shared by every API worker and kept across deploys
+
+    A partial unique index on dedupe_key WHERE active makes get_or_create_job
+    a single INSERT ... ON CONFLICT. Finished rows are deleted after
+    JOB_TTL_SECONDS by a sweep that runs at most every JOB_EVICTION_INTERVAL.
+    """
+    _COLUMNS = "id, url, status, progress, message, user_id, watchers, created_at, last_updated, dedupe_key, metrics"
+
+    def __init__(self, ttl: float = JOB_TTL_SECONDS):
+        self._ttl = ttl
+        self._last_eviction = 0.0
+        self._evicted = 0
+        self._eviction_lock = Lock()
+
+    @staticmethod
+    def _to_job(row: Dict[str, Any]) -> Dict[str, Any]:
+        job = dict(row)
+        job.pop("id", None)
+        return job
+
+    def _maybe_evict(self):
+        now = time.time()
+        if now - self._last_eviction < JOB_EVICTION_INTERVAL or not self._eviction_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_eviction = now
+            rows = db.execute_query(
+                "DELETE FROM jobs WHERE NOT active AND last_updated < %s RETURNING id",
+                (now - self._ttl,), fetch=True, many=True
+            )
+            _forget_published([row["id"] for row in rows])
+            evicted = len(rows)
+            self._evicted += evicted
+            if evicted:
+                logger.info(f"Evicted {evicted} finished jobs")
+        except Exception as e:
+            logger.warning(f"Job eviction failed: {str(e)}")
+        finally:
+            self._eviction_lock.release()
+
+    def _insert(self, url: str, user_id: int, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        job_id = str(uuid.uuid4())
+        job = _new_job(url, user_id)
+        job["dedupe_key"] = key
+        row = db.execute_query(
+            "INSERT INTO jobs (id, url, status, progress, message, user_id, created_at, last_updated, dedupe_key, active) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE) "
+            "ON CONFLICT (dedupe_key) WHERE active DO NOTHING RETURNING id",
+            (job_id, job["url"], job["status"], job["progress"], job["message"],
+             job["user_id"], job["created_at"], job["last_updated"], key),
+            fetch=True
+        )
+        return (job_id, job) if row else None
+
+    def create_job(self, url: str, user_id: int) -> str:
+        job_id, _, _ = self.get_or_create_job(url, user_id, url)
+        return job_id
+
+    def get_or_create_job(self, url: str, user_id: int, key: str) -> Tuple[str, Dict[str, Any], bool]:
+        self._maybe_evict()
+        # The active job can finish between the conflicting insert and the lookup, so retry once
+        for _ in range(2):
+            created = self._insert(url, user_id, key)
+            if created:
+                return created[0], created[1], True
+            existing = self.find_active_job(key)
+            if existing:
+                return existing[0], existing[1], False
+        raise RuntimeError(f"Could not create or find an active job for {key}")
+
+    def add_job_watcher(self, job_id: str, user_id: int) -> bool:
+        rows = db.execute_query(
+            "UPDATE jobs SET watchers = CASE WHEN user_id = %s OR watchers @> ARRAY[%s]::int[] "
+            "THEN watchers ELSE array_append(watchers, %s) END WHERE id = %s AND active",
+            (user_id, user_id, user_id, job_id)
+        )
+        return rows > 0
+
+    def remove_job_watcher(self, job_id: str, user_id: int) -> bool:
+        rows = db.execute_query(
+            "UPDATE jobs SET watchers = array_remove(watchers, %s) WHERE id = %s AND watchers @> ARRAY[%s]::int[]",
+            (user_id, job_id, user_id)
+        )
+        return rows > 0
+
+    def find_active_job(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        row = db.execute_query(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE dedupe_key = %s AND active",
+            (key,), fetch=True, single=True
+        )
+        return (row["id"], self._to_job(row)) if row else None
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = db.execute_query(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE id = %s",
+            (job_id,), fetch=True, single=True
+        )
+        return self._to_job(row) if row else None
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        rows = db.execute_query(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE id = ANY(%s)",
+            (list(job_ids),), fetch=True
+        )
+        return {row["id"]: self._to_job(row) for row in rows}
+
+    def get_jobs_for_user(self, user_id: int, since: float) -> Dict[str, Dict[str, Any]]:
+        rows = db.execute_query(
+            f"SELECT {self._COLUMNS} FROM jobs "
+            "WHERE (user_id = %s OR watchers @> ARRAY[%s]::int[]) AND (active OR last_updated >= %s)",
+            (user_id, user_id, since), fetch=True
+        )
+        return {row["id"]: self._to_job(row) for row in rows}
+
+    def update_job_progress(self, job_id: str, status: str, progress: int, message: str = "") -> Optional[Dict[str, Any]]:
+        active = status not in TERMINAL_STATUSES
+        # Finishing clears the cancel flag so a retried job starts clean
+        row = db.execute_query(
+            "UPDATE jobs SET status = %s, progress = %s, message = %s, last_updated = %s, active = %s, "
+            f"cancel_requested = cancel_requested AND %s WHERE id = %s RETURNING {self._COLUMNS}",
+            (status, progress, message, time.time(), active, active, job_id),
+            fetch=True
+        )
+        return self._to_job(row) if row else None
+
+    def reactivate_failed_job(self, job_id: str, message: str) -> Optional[Dict[str, Any]]:
+        try:
+            row = db.execute_query(
+                "UPDATE jobs SET status = 'Queued', message = %s, last_updated = %s, active = TRUE "
+                "WHERE id = %s AND status = 'Failed' AND NOT EXISTS "
+                "(SELECT 1 FROM jobs other WHERE other.dedupe_key = jobs.dedupe_key AND other.active) "
+                f"RETURNING {self._COLUMNS}",
+                (message, time.time(), job_id), fetch=True
+            )
+        except psycopg2.IntegrityError:
+            # Another job for the same key became active in between
+            return None
+        return self._to_job(row) if row else None
+
+    def get_all_jobs(self) -> Dict[str, Dict[str, Any]]:
+        rows = db.execute_query(f"SELECT {self._COLUMNS} FROM jobs", fetch=True)
+        return {row["id"]: self._to_job(row) for row in rows}
+
+    def save_checkpoint(self, job_id: str, stage: str, data: Dict[str, Any]):
+        db.execute_query(
+            "UPDATE jobs SET checkpoints = checkpoints || jsonb_build_object(%s::text, %s::jsonb) WHERE id = %s",
+            (stage, json.dumps(data), job_id)
+        )
+
+    def get_checkpoints(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        row = db.execute_query(
+            "SELECT checkpoints FROM jobs WHERE id = %s",
+            (job_id,), fetch=True, single=True
+        )
+        return row["checkpoints"] if row and row["checkpoints"] else {}
+
+    def request_cancel(self, job_id: str) -> bool:
+        rows = db.execute_query(
+            "UPDATE jobs SET cancel_requested = TRUE WHERE id = %s AND active",
+            (job_id,)
+        )
+        return rows > 0
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        row = db.execute_query(
+            "SELECT cancel_requested FROM jobs WHERE id = %s",
+            (job_id,), fetch=True, single=True
+        )
+        return bool(row and row["cancel_requested"])
+
+    def update_job_metrics(self, job_id: str, metrics: Dict[str, Any]):
+        db.execute_query(
+            "UPDATE jobs SET metrics = metrics || %s::jsonb WHERE id = %s",
+            (json.dumps(metrics), job_id)
+        )
+
+    def get_stats(self) -> Dict[str, int]:
+        row = db.execute_query(
+            "SELECT count(*) AS retained, count(*) FILTER (WHERE active) AS active FROM jobs",
+            fetch=True, single=True
+        )
+        return {
+            "retained": row["retained"],
+            "active": row["active"],
+            "finished": row["retained"] - row["active"],
+            "evicted": self._evicted,
+        }
+
+    # --- Local imports (IMPORT_MODE = "local") ---
+    # The API process running a job holds a lease on it (the same columns as
+    # the shared queue) and renews it for all its jobs while they wait in its
+    # scheduler or run, so only jobs whose process died count as orphaned.
+    # attempts only counts worker claims, so attempts = 0 leaves jobs of the
+    # shared queue alone.
+
+    def lease_local_job(self, job_id: str, owner: str, lease_seconds: float):
+        db.execute_query(
+            "UPDATE jobs SET lease_owner = %s, lease_expires_at = %s WHERE id = %s",
+            (owner, time.time() + lease_seconds, job_id)
+        )
+
+    def renew_local_leases(self, owner: str, lease_seconds: float) -> int:
+        return db.execute_query(
+            "UPDATE jobs SET lease_expires_at = %s WHERE lease_owner = %s AND active",
+            (time.time() + lease_seconds, owner)
+        )
+
+    def claim_stale_jobs(self, stale_after: float, owner: str, lease_seconds: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Atomically take over unfinished local jobs whose lease has expired
+        (their process died in a deploy), or that were never leased and have
+        not been touched for stale_after seconds. Leasing them to owner in the
+        same UPDATE means only one API worker claims each job.
+        """
+        now = time.time()
+        rows = db.execute_query(
+            "UPDATE jobs SET status = 'Queued', message = 'Resumed after restart', last_updated = %s, "
+            "lease_owner = %s, lease_expires_at = %s "
+            "WHERE active AND NOT queued AND attempts = 0 "
+            "AND (lease_expires_at < %s OR (lease_owner IS NULL AND last_updated < %s)) "
+            f"RETURNING {self._COLUMNS}",
+            (now, owner, now + lease_seconds, now, now - stale_after), fetch=True, many=True
+        )
+        return [(row["id"], self._to_job(row)) for row in rows]
+
+    # --- Shared import queue (IMPORT_MODE = "queue") ---
+    # Queued jobs wait with queued = TRUE. A worker claims one with
+    # SELECT ... FOR UPDATE SKIP LOCKED and holds a lease it renews while
+    # working; a job whose lease expires (worker died) is claimed again until
+    # it has used up its attempts.
+
+    def enqueue_job(self, job_id: str):
+        db.execute_query(
+            "UPDATE jobs SET queued = TRUE, attempts = 0, lease_owner = NULL, lease_expires_at = NULL WHERE id = %s",
+            (job_id,)
+        )
+
+    def _claim(self, where: str, order_by: str, params: tuple, worker_id: str, lease_seconds: float):
+        now = time.time()
+        row = db.execute_query(
+            "UPDATE jobs SET queued = FALSE, lease_owner = %s, lease_expires_at = %s, "
+            "attempts = attempts + 1, last_updated = %s "
+            f"WHERE id = (SELECT id FROM jobs WHERE {where} ORDER BY {order_by} "
+            "FOR UPDATE SKIP LOCKED LIMIT 1) "
+            f"RETURNING {self._COLUMNS}, attempts",
+            (worker_id, now + lease_seconds, now) + params,
+            fetch=True
+        )
+        return (row["id"], self._to_job(row)) if row else None
+
+    def claim_next_job(self, worker_id: str, lease_seconds: float, max_attempts: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+        # Jobs abandoned by a dead worker first, then the oldest queued job
+        return (
+            self._claim("active AND lease_owner IS NOT NULL AND lease_expires_at < %s AND attempts < %s",
+                        "lease_expires_at", (time.time(), max_attempts), worker_id, lease_seconds)
+            or self._claim("queued", "created_at", (), worker_id, lease_seconds)
+        )
+
+    def renew_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease; False means another worker has taken the job over"""
+        rows = db.execute_query(
+            "UPDATE jobs SET lease_expires_at = %s WHERE id = %s AND lease_owner = %s",
+            (time.time() + lease_seconds, job_id, worker_id)
+        )
+        return rows > 0
+
+    def release_job(self, job_id: str, worker_id: str):
+        db.execute_query(
+            "UPDATE jobs SET lease_owner = NULL, lease_expires_at = NULL WHERE id = %s AND lease_owner = %s",
+            (job_id, worker_id)
+        )
+
+    def requeue_job(self, job_id: str, worker_id: str, message: str) -> bool:
+        # A stage may have failed the job (active = FALSE) and a new import of
+        # the same video taken the dedupe key since; then it stays finished
+        try:
+            rows = db.execute_query(
+                "UPDATE jobs SET status = 'Queued', message = %s, queued = TRUE, active = TRUE, lease_owner = NULL, "
+                "lease_expires_at = NULL, last_updated = %s WHERE id = %s AND lease_owner = %s AND NOT EXISTS "
+                "(SELECT 1 FROM jobs other WHERE other.dedupe_key = jobs.dedupe_key AND other.active AND other.id <> jobs.id)",
+                (message, time.time(), job_id, worker_id)
+            )
+        except psycopg2.IntegrityError:
+            return False
+        return rows > 0
+
+    def fail_exhausted_jobs(self, max_attempts: int) -> int:
+        """Fail jobs whose lease expired on their last allowed attempt"""
+        return db.execute_query(
+            "UPDATE jobs SET status = 'Failed', active = FALSE, lease_owner = NULL, lease_expires_at = NULL, "
+            "message = 'Import worker stopped responding too many times', last_updated = %s "
+            "WHERE active AND lease_owner IS NOT NULL AND lease_expires_at < %s AND attempts >= %s",
+            (time.time(), time.time(), max_attempts)
+        )
+
+_STORES = {
+    "memory": InMemoryJobStore,
+    "postgres": PostgresJobStore,
+}
+_store = _STORES[JOB_STORE]()
+
+def set_job_store(store) -> None:
+    """Swap the backend (e.g. a fresh InMemoryJobStore in tests)"""
+    global _store
+    _store = store
 
 def create_job(url: str, user_id: int) -> str:
     """Create a new job entry in a thread-safe way."""
-    job_id = str(uuid.uuid4())
-    with _video_jobs_lock:
-        _video_jobs[job_id] = {
-            "url": url,
-            "status": "Queued",
-            "progress": 0,
-            "message": "Waiting to start processing",
-            "user_id": user_id,
-            "created_at": time.time(),
-            "last_updated": time.time()
-        }
-    return job_id
+    return _store.create_job(url, user_id)
+
+def get_or_create_job(url: str, user_id: int, key: str = None) -> Tuple[str, Dict[str, Any], bool]:
+    """
+    Return the active job for key (the URL by default), creating one if there
+    is none. The third element tells whether the job was created by this call.
+    """
+    return _store.get_or_create_job(url, user_id, key or url)
+
+def add_job_watcher(job_id: str, user_id: int) -> bool:
+    """
+    Attach another user to an unfinished job for the same video: they see its
+    progress and are linked to the video when it is saved. False if the job
+    has already finished.
+    """
+    return _store.add_job_watcher(job_id, user_id)
+
+def remove_job_watcher(job_id: str, user_id: int) -> bool:
+    """Detach a watcher from a job; they are no longer linked to its video. False if they weren't watching"""
+    return _store.remove_job_watcher(job_id, user_id)
+
+def find_active_job(key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(job_id, job) of the unfinished job for key, or None"""
+    return _store.find_active_job(key)
 
 def get_job(job_id: str) -> Dict[str, Any]:
     """Get job details in a thread-safe way."""
-    with _video_jobs_lock:
-        return _video_jobs.get(job_id, None)
+    return _store.get_job(job_id)
 
 def update_job_progress(job_id: str, status: str, progress: int, message: str = ""):
-    """Update job progress in a thread-safe way."""
-    with _video_jobs_lock:
-        if job_id in _video_jobs:
-            _video_jobs[job_id].update({
-                "status": status,
-                "progress": progress,
-                "message": message,
-                "last_updated": time.time()
-            })
+    """Update job progress in a thread-safe way and notify progress streams."""
+    job = _store.update_job_progress(job_id, status, progress, message)
+    if job is not None:
+        _publish(job_id, job)
+
+def reactivate_failed_job(job_id: str, message: str) -> Optional[Dict[str, Any]]:
+    """
+    Put a failed job back to Queued in one step, keeping its progress. None
+    if it is no longer failed or another job for its dedupe key is active.
+    """
+    job = _store.reactivate_failed_job(job_id, message)
+    if job is not None:
+        _publish(job_id, job)
+    return job
+
+def get_jobs(job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Jobs by id in one lookup; unknown ids are left out"""
+    return _store.get_jobs(job_ids)
+
+def get_jobs_for_user(user_id: int) -> Dict[str, Dict[str, Any]]:
+    """A user's unfinished jobs (own or watched) plus those finished within RECENT_JOB_WINDOW"""
+    return _store.get_jobs_for_user(user_id, time.time() - RECENT_JOB_WINDOW)
+
+# --- Progress subscriptions ---
+# Streaming endpoints subscribe per user with an asyncio queue; worker threads
+# publish into it through the subscriber's event loop. Only status/progress
+# changes are pushed. Subscribers also refresh from the store periodically,
+# which covers updates made by other processes with the Postgres store.
+_subscribers: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+_last_published: Dict[str, Tuple[str, int]] = {}
+_subscribers_lock = Lock()
+
+def _forget_published(job_ids: List[str]):
+    """Drop dedupe state of evicted jobs, including ones this process never saw finish"""
+    with _subscribers_lock:
+        for job_id in job_ids:
+            _last_published.pop(job_id, None)
+
+def _offer(queue: asyncio.Queue, item):
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        pass  # the subscriber's periodic refresh will catch up
+
+def _publish(job_id: str, job: Dict[str, Any]):
+    state = (job["status"], job["progress"])
+    with _subscribers_lock:
+        if _last_published.get(job_id) == state:
+            return
+        if job["status"] in TERMINAL_STATUSES:
+            _last_published.pop(job_id, None)
+        else:
+            _last_published[job_id] = state
+        targets = [
+            entry for user_id in [job["user_id"]] + list(job.get("watchers") or [])
+            for entry in _subscribers.get(user_id, ())
+        ]
+    for loop, queue in targets:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, (job_id, job))
+        except RuntimeError:
+            pass  # loop already closed; unsubscribe will clean up
+
+def subscribe(user_id: int, maxsize: int = 1000) -> asyncio.Queue:
+    """Queue of (job_id, job) updates for the user's jobs; call from the event loop"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    with _subscribers_lock:
+        _subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+    return queue
+
+def unsubscribe(user_id: int, queue: asyncio.Queue):
+    with _subscribers_lock:
+        subscribers = _subscribers.get(user_id, set())
+        for entry in [entry for entry in subscribers if entry[1] is queue]:
+            subscribers.discard(entry)
+        if not subscribers:
+            _subscribers.pop(user_id, None)
 
 def get_all_jobs() -> Dict[str, Dict[str, Any]]:
     """Get all jobs (for debugging)"""
-    with _video_jobs_lock:
-        return _video_jobs.copy()
\ No newline at end of file
+    return _store.get_all_jobs()
+
+def save_checkpoint(job_id: str, stage: str, data: Dict[str, Any]):
+    """Record the JSON-serializable output of a completed stage"""
+    _store.save_checkpoint(job_id, stage, data)
+
+def get_checkpoints(job_id: str) -> Dict[str, Dict[str, Any]]:
+    """Stage name -> checkpointed output for every stage the job has completed"""
+    return _store.get_checkpoints(job_id)
+
+def enqueue_job(job_id: str):
+    """Hand a job to the shared import queue for worker processes"""
+    _store.enqueue_job(job_id)
+
+def claim_next_job(worker_id: str, lease_seconds: float, max_attempts: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Lease the next queued (or abandoned) job to worker_id"""
+    return _store.claim_next_job(worker_id, lease_seconds, max_attempts)
+
+def renew_lease(job_id: str, worker_id: str, lease_seconds: float) -> bool:
+    return _store.renew_lease(job_id, worker_id, lease_seconds)
+
+def release_job(job_id: str, worker_id: str):
+    _store.release_job(job_id, worker_id)
+
+def requeue_job(job_id: str, worker_id: str, message: str) -> bool:
+    """
+    Give a leased job back to the queue for another attempt. False if it was
+    not requeued: the lease was lost, or another job for the same dedupe key
+    is active.
+    """
+    return _store.requeue_job(job_id, worker_id, message)
+
+def fail_exhausted_jobs(max_attempts: int) -> int:
+    return _store.fail_exhausted_jobs(max_attempts)
+
+def update_job_metrics(job_id: str, metrics: Dict[str, Any]):
+    """Merge per-job measurements (e.g. download bytes and throughput) into the job"""
+    _store.update_job_metrics(job_id, metrics)
+
+def request_cancel(job_id: str) -> bool:
+    """Flag an unfinished job for cancellation; False if it is unknown or already finished"""
+    return _store.request_cancel(job_id)
+
+def is_cancel_requested(job_id: str) -> bool:
+    return _store.is_cancel_requested(job_id)
+
+class JobCancelled(Exception):
+    """Raised inside a running import once its job has been cancelled"""
+
+class CancelToken:
+    """Cooperative cancellation check for one job, cheap enough to call per chunk
+
+    The job store is consulted at most every CANCEL_CHECK_INTERVAL seconds;
+    once a cancel is seen it sticks.
+    """
+    def __init__(self, job_id: str, interval: float = CANCEL_CHECK_INTERVAL):
+        self.job_id = job_id
+        self._interval = interval
+        self._checked_at = 0.0
+        self._cancelled = False
+
+    def cancelled(self) -> bool:
+        now = time.monotonic()
+        if not self._cancelled and now - self._checked_at >= self._interval:
+            self._checked_at = now
+            try:
+                self._cancelled = is_cancel_requested(self.job_id)
+            except Exception as e:
+                logger.warning(f"Cancel check failed for job {self.job_id}: {str(e)}")
+        return self._cancelled
+
+    def check(self):
+        if self.cancelled():
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+    __call__ = check
+
+def get_job_stats() -> Dict[str, int]:
+    """How many jobs are retained, active and finished, and how many were evicted"""
+    return _store.get_stats()
+
+def claim_stale_jobs(stale_after: float, owner: str, lease_seconds: float) -> List[Tuple[str, Dict[str, Any]]]:
+    """Unfinished jobs from a dead process that this process (owner) should resume"""
+    return _store.claim_stale_jobs(stale_after, owner, lease_seconds)
+
+def lease_local_job(job_id: str, owner: str, lease_seconds: float):
+    """Mark a job as held by this API process until the lease expires"""
+    _store.lease_local_job(job_id, owner, lease_seconds)
+
+def renew_local_leases(owner: str, lease_seconds: float) -> int:
+    """Extend the leases of every unfinished job owner holds"""
+    return _store.renew_local_leases(owner, lease_seconds)
@@ -1,40 +1,88 @@
 from utils.utils import get_settings, get_logger
-from openai import OpenAI
 
 # Initialize settings and logger
 settings = get_settings()
 logger = get_logger(settings.LOGS_PATH)
 
 openai_api_key = settings.OPENAI_API_KEY
-client = OpenAI(api_key=openai_api_key)
 
 
 from fastapi import FastAPI, HTTPException, Response, Request, Depends
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
-from jobs_progress import create_job,get_job,update_job_progress,get_all_jobs
-from pydantic import BaseModel, EmailStr, field_validator
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from jobs_progress import get_or_create_job,add_job_watcher,remove_job_watcher,find_active_job,get_job,get_jobs,get_jobs_for_user,update_job_progress,reactivate_failed_job,get_job_stats,claim_stale_jobs,lease_local_job,renew_local_leases,enqueue_job,request_cancel,subscribe,unsubscribe,JobCancelled,JOB_STORE,TERMINAL_STATUSES
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from urllib.parse import urlparse
-import re, transcribe, download, db, os, json, concurrent.futures, time
+import re, db, download, importer, comments, os, json, socket, threading, time, asyncio, concurrent.futures
+from scheduler import FairScheduler, QueueFullError
+from stats_refresher import StatsRefresher
+from utils.rate_limit import tiktok_limiter
+from utils.pyktok_patch import get_video_urls, session_pool
 
-from create_vector_db import add_new_transcript
 import itsdangerous
-from db import delete_highlight, update_highlight, get_highlights_for_video, add_highlight
+from db import delete_highlight_async, update_highlight_async, get_highlights_for_video_async, add_highlight_async
 from fastapi.middleware.cors import CORSMiddleware
 from rag import ask, ask_from_all_videos
-from typing import Optional
+from typing import List, Optional
 
 logger.info(f"Loaded config for env: {settings.current_env}")
 logger.debug(f"OpenAI API key loaded: {openai_api_key[:5]}...")  # Log partial key for security
 
 app = FastAPI()
 
-MAX_RETRIES = 3
+JOB_RESUME_STALE_AFTER = settings.get("JOB_RESUME_STALE_AFTER", 600)  # seconds a local job outlives its process's last lease renewal before another process resumes it
+JOB_LEASE_RENEW_INTERVAL = settings.get("JOB_LEASE_RENEW_INTERVAL", 60)  # seconds between lease renewals of this process's jobs
+# Lease owner of the jobs this API process runs
+API_INSTANCE_ID = f"api:{socket.gethostname()}:{os.getpid()}"
+# "local" runs imports in this process's pipeline; "queue" only enqueues them for worker.py processes
+IMPORT_MODE = settings.get("IMPORT_MODE", "local")
+if IMPORT_MODE not in ("local", "queue"):
+    raise SystemExit(f'IMPORT_MODE must be "local" or "queue", not "{IMPORT_MODE}"')
+if IMPORT_MODE == "queue" and JOB_STORE != "postgres":
+    raise SystemExit('IMPORT_MODE = "queue" needs JOB_STORE = "postgres"')
+PROGRESS_STREAM_REFRESH = settings.get("PROGRESS_STREAM_REFRESH", 5)  # seconds between store refreshes / keepalives on /progress/stream
+PROGRESS_BATCH_MAX = settings.get("PROGRESS_BATCH_MAX", 200)  # job ids one /progress/batch or /progress/stream request may ask for
 VIDEO_DIR = "videos"
 os.makedirs(VIDEO_DIR, exist_ok=True)
 app.mount("/videos", StaticFiles(directory=VIDEO_DIR), name="videos")
-video_jobs = {}
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=20)
+IMPORT_QUEUE_MAX = settings.get("IMPORT_QUEUE_MAX", 500)  # imports waiting to start before /import_video answers 429
+IMPORT_USER_CONCURRENCY = settings.get("IMPORT_USER_CONCURRENCY", 2)  # imports one user may have in the pipeline at once
+IMPORT_USER_QUEUE_MAX = settings.get("IMPORT_USER_QUEUE_MAX", 100)  # imports one user may have waiting before their requests answer 429
+# Scheduler priorities: higher levels are dispatched first
+PRIORITY_RETRY = 1
+PRIORITY_NORMAL = 0
+PRIORITY_BULK = -1
+# Videos one /import_bulk request may start; kept within the user's IMPORT_USER_QUEUE_MAX share of the scheduler
+BULK_IMPORT_MAX_URLS = min(settings.get("BULK_IMPORT_MAX_URLS", 100), IMPORT_USER_QUEUE_MAX)
+BULK_LIST_CONCURRENCY = settings.get("BULK_LIST_CONCURRENCY", 3)  # creator/hashtag listings fetched at once
+BULK_SOURCES_MAX = settings.get("BULK_SOURCES_MAX", 20)  # creators plus hashtags one /import_bulk request may list
+BULK_VIDEO_COUNT_MAX = settings.get("BULK_VIDEO_COUNT_MAX", 100)  # videos listed per creator/hashtag at most
+STATS_REFRESH_ENABLED = settings.get("STATS_REFRESH_ENABLED", True)  # refresh engagement stats of stored videos in the background
+
+def dispatch_import(item):
+    ctx, start_at = item
+    try:
+        # Blocking submit: the pipeline's backpressure keeps waiting jobs in the fair scheduler
+        import_pipeline.submit(ctx, start_at=start_at, block=True)
+    except Exception as e:
+        importer.handle_import_error(ctx, e)
+        raise
+
+import_pipeline = importer.build_import_pipeline(
+    on_done=lambda ctx: import_scheduler.job_finished(ctx["user_id"], ctx["job_id"])
+)
+import_scheduler = FairScheduler(
+    dispatch_import,
+    max_depth=IMPORT_QUEUE_MAX,
+    per_user_limit=IMPORT_USER_CONCURRENCY,
+    parallelism=import_pipeline.stages[0].workers,
+    per_user_depth=IMPORT_USER_QUEUE_MAX,
+)
+if IMPORT_MODE == "local":
+    import_pipeline.start()
+    import_scheduler.start()
+stats_refresher = StatsRefresher()
 
 app.add_middleware(
     CORSMiddleware,
@@ -45,6 +93,7 @@ app.add_middleware(
     allow_credentials=True,                  
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Cookie signing
@@ -79,6 +128,21 @@ class LoginRequest(BaseModel):
     def password_strength(cls, value):
         return value  # No need to validate again during login
 
+class ProgressBatchRequest(BaseModel):
+    job_ids: List[str] = Field(max_length=PROGRESS_BATCH_MAX)
+
+class BulkImportRequest(BaseModel):
+    creators: List[str] = Field([], max_length=BULK_SOURCES_MAX)
+    hashtags: List[str] = Field([], max_length=BULK_SOURCES_MAX)
+    urls: List[str] = []
+    video_count: int = Field(30, ge=1, le=BULK_VIDEO_COUNT_MAX)  # videos listed per creator/hashtag
+
+    @field_validator("hashtags")
+    def source_count(cls, value, info):
+        if len(value) + len(info.data.get("creators", [])) > BULK_SOURCES_MAX:
+            raise ValueError(f"At most {BULK_SOURCES_MAX} creators and hashtags in total")
+        return value
+
 class QueryRequest(BaseModel):
     video_id: int
     question: str
@@ -120,14 +184,97 @@ def clean_tiktok_url(url):
     parsed = urlparse(url)
     return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
 
+def join_or_create_job(url: str, tiktok_id: str, user_id: int):
+    """
+    (job_id, job, created) of the in-flight import of tiktok_id, creating one
+    if there is none. Another user's job is joined as a watcher, so every
+    user asking for the video is linked to it when it is saved.
+    """
+    for _ in range(2):
+        job_id, job, created = get_or_create_job(url, user_id, key=tiktok_id)
+        if created or job["user_id"] == user_id or add_job_watcher(job_id, user_id):
+            return job_id, job, created
+        # The job finished in between; a fresh job links the saved video (or retries a failed import)
+    raise RuntimeError(f"Could not create or join an import job for video {tiktok_id}")
+
+def job_visible_to(job: dict, user_id: int) -> bool:
+    """Whether user_id started the job or joined it as a watcher (importing the same video)"""
+    return user_id == job["user_id"] or user_id in (job.get("watchers") or [])
+
+def queue_full_message(error: QueueFullError) -> str:
+    if error.user_limit:
+        return "You have too many imports waiting, please try again later"
+    return "Import queue is full, please try again later"
+
+def submit_import(job_id: str, user_id: int, url: str, resume: bool = False,
+                  priority: int = PRIORITY_NORMAL, force: bool = False):
+    """
+    Start a job: in local mode queue it in the fair scheduler (at its
+    checkpoint when resume is set; raises QueueFullError at capacity unless
+    force), in queue mode hand it to the worker processes. Returns the stage
+    it will start at, or None in queue mode where the worker resumes from
+    the checkpoints itself.
+
+    Any other failure marks the job Failed before re-raising, so it doesn't
+    hold the video's dedupe key as a job nothing will run.
+    """
+    try:
+        if IMPORT_MODE == "queue":
+            enqueue_job(job_id)
+            return None
+        if resume:
+            ctx, start_at = importer.resume_import(job_id, user_id, url)
+        else:
+            ctx, start_at = importer.new_import(job_id, user_id, url), "download"
+        lease_local_job(job_id, API_INSTANCE_ID, JOB_RESUME_STALE_AFTER)
+        import_scheduler.submit(job_id, user_id, (ctx, start_at), priority=priority, force=force)
+        return start_at
+    except QueueFullError:
+        raise
+    except Exception as e:
+        logger.error(f"Could not start job {job_id}: {str(e)}")
+        update_job_progress(job_id, "Failed", 0, "Could not start the import, please try again")
+        raise
+
+def resume_stale_jobs():
+    for job_id, job in claim_stale_jobs(JOB_RESUME_STALE_AFTER, API_INSTANCE_ID, JOB_RESUME_STALE_AFTER):
+        logger.info(f"Resuming job {job_id} for URL: {job['url']}")
+        # Forced: resumed work is never rejected
+        submit_import(job_id, job["user_id"], job["url"], resume=True, priority=PRIORITY_RETRY, force=True)
+
+lease_renewal_stop = threading.Event()
+
+def renew_job_leases():
+    """Keep this process's waiting and running jobs leased so other API workers don't resume them"""
+    while not lease_renewal_stop.wait(JOB_LEASE_RENEW_INTERVAL):
+        try:
+            renew_local_leases(API_INSTANCE_ID, JOB_RESUME_STALE_AFTER)
+        except Exception as e:
+            logger.warning(f"Renewing job leases failed: {str(e)}")
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up application...")
+    await db.init_async_pool()
+    # Pick up imports orphaned by a previous deploy (no-op with the in-memory job store;
+    # in queue mode the workers reclaim expired leases themselves)
+    if IMPORT_MODE == "local":
+        threading.Thread(target=renew_job_leases, name="job-leases", daemon=True).start()
+        threading.Thread(target=resume_stale_jobs, name="resume-jobs", daemon=True).start()
+    if STATS_REFRESH_ENABLED:
+        stats_refresher.start()
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     logger.info("Shutting down application...")
-    executor.shutdown(wait=True)
+    stats_refresher.stop()
+    lease_renewal_stop.set()
+    if IMPORT_MODE == "local":
+        import_scheduler.stop()
+        import_pipeline.shutdown(wait=True)
+    session_pool.close()
+    db.close_pool()
+    await db.close_async_pool()
 
 @app.post("/signup")
 def signup(req: SignupRequest):
@@ -215,46 +362,253 @@ def import_video(
 ):
     try:
         user_id = user["user_id"]
-        req.url = clean_tiktok_url(req.url)
+        try:
+            # Short links, redirects and different handles all resolve to one TikTok id
+            tiktok_id, req.url = download.resolve_video(clean_tiktok_url(req.url))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         logger.info(f"Import video request from user {user_id} for URL: {req.url}")
 
-        # Check for existing jobs for this URL
-        all_jobs = get_all_jobs()
-        for job_id, job in all_jobs.items():
-            if job["url"] == req.url and job["status"] not in ["Failed", "Completed"]:
-                logger.info(f"Video already being processed: {req.url}")
-                return {
-                    "message": "Video is already being processed.",
-                    "clean_url": req.url,
-                    "job_id": job_id,
-                    "status": job["status"],
-                    "progress": job.get("progress", 0)
-                }
-
-        # Create a new job
-        job_id = create_job(req.url, user_id)
-        executor.submit(import_worker, job_id, user_id, req.url)
+        # Reuse the in-flight job for this video, if any
+        job_id, job, created = join_or_create_job(req.url, tiktok_id, user_id)
+        if not created:
+            logger.info(f"Video already being processed: {req.url}")
+            return {
+                "message": "Video is already being processed.",
+                "clean_url": req.url,
+                "video_id": tiktok_id,
+                "job_id": job_id,
+                "status": job["status"],
+                "progress": job.get("progress", 0)
+            }
+
+        try:
+            submit_import(job_id, user_id, req.url)
+        except QueueFullError as e:
+            detail = queue_full_message(e)
+            update_job_progress(job_id, "Failed", 0, detail)
+            logger.warning(f"{str(e)}, rejected URL from user {user_id}: {req.url}")
+            raise HTTPException(
+                status_code=429,
+                detail=detail,
+                headers={"Retry-After": str(e.retry_after)}
+            )
 
         return {
             "message": "Video import started",
             "clean_url": req.url,
+            "video_id": tiktok_id,
             "job_id": job_id,
             "status": "Queued",
-            "progress": 0
+            "progress": 0,
+            "queue_position": import_scheduler.queue_position(job_id)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Video import error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-# Update the progress endpoint
+async def list_bulk_sources(req: BulkImportRequest):
+    """
+    Video URLs of the requested creators and hashtags, listed concurrently;
+    returns (urls, errors). Listing stops once BULK_IMPORT_MAX_URLS videos
+    are in hand, and the sources not listed come back as errors.
+    """
+    semaphore = asyncio.Semaphore(BULK_LIST_CONCURRENCY)
+    sources = [(name.lstrip("@"), "user") for name in req.creators] + \
+              [(name.lstrip("#"), "hashtag") for name in req.hashtags]
+    remaining = BULK_IMPORT_MAX_URLS - len(set(req.urls))
+
+    async def list_one(name: str, ent_type: str):
+        nonlocal remaining
+        async with semaphore:
+            if remaining <= 0:
+                raise RuntimeError("Not listed, the bulk import limit was reached")
+            urls = await get_video_urls(name, ent_type, min(req.video_count, remaining))
+            remaining -= len(urls)
+            return urls
+
+    results = await asyncio.gather(*(list_one(name, ent_type) for name, ent_type in sources), return_exceptions=True)
+    urls, errors = [], []
+    for (name, ent_type), result in zip(sources, results):
+        if isinstance(result, Exception):
+            logger.error(f"Listing {ent_type} {name} failed: {str(result)}")
+            errors.append({"source": name, "type": ent_type, "error": str(result)})
+        else:
+            urls.extend(result)
+    return urls, errors
+
+def start_bulk_import(user_id: int, urls: List[str]) -> dict:
+    """Link already-imported videos in one batch and queue low-priority jobs for the rest"""
+    videos, unresolved = {}, []
+    for url in urls:
+        try:
+            tiktok_id, resolved = download.resolve_video(url)
+        except Exception as e:
+            logger.warning(f"Could not resolve {url}: {str(e)}")
+            unresolved.append(url)
+            continue
+        videos.setdefault(tiktok_id, resolved)
+    existing = db.get_video_ids_by_tiktok_ids(list(videos))
+    linked = db.link_user_videos(user_id, list(existing.values()))
+    jobs, rejected, retry_after, rejected_reason = [], [], None, None
+    for tiktok_id, url in videos.items():
+        if tiktok_id in existing:
+            continue
+        if retry_after is not None:
+            rejected.append(url)
+            continue
+        job_id, job, created = join_or_create_job(url, tiktok_id, user_id)
+        if created:
+            try:
+                submit_import(job_id, user_id, url, priority=PRIORITY_BULK)
+            except QueueFullError as e:
+                # Usually this user's own queue share; other users' imports are still admitted
+                rejected_reason = queue_full_message(e)
+                update_job_progress(job_id, "Failed", 0, rejected_reason)
+                retry_after = e.retry_after
+                rejected.append(url)
+                continue
+        jobs.append({"url": url, "video_id": tiktok_id, "job_id": job_id, "status": job["status"]})
+    return {
+        "already_imported": len(existing),
+        "newly_linked": linked,
+        "jobs": jobs,
+        "rejected": rejected,
+        "unresolved": unresolved,
+        "retry_after": retry_after,
+        "rejected_reason": rejected_reason,
+    }
+
+@app.post("/import_bulk")
+async def import_bulk(req: BulkImportRequest, user=Depends(get_current_user)):
+    """
+    Import many videos at once: every video of the given creators and
+    hashtags plus an explicit URL list. Links are resolved to TikTok video
+    ids (unresolvable ones come back under "unresolved") and duplicates
+    collapse. Videos already in the library are linked in one batch; the
+    rest become low-priority jobs, counted against the user's own
+    IMPORT_USER_QUEUE_MAX share of the import queue so a bulk import can't
+    crowd out other users. Once that share (or the whole queue) is full, the
+    remaining URLs come back under "rejected" with a Retry-After header.
+    """
+    try:
+        user_id = user["user_id"]
+        listed, errors = await list_bulk_sources(req)
+        urls = list(dict.fromkeys(clean_tiktok_url(url) for url in req.urls + listed))
+        if not urls and errors:
+            raise HTTPException(status_code=502, detail="Could not list any videos from TikTok")
+        truncated = max(0, len(urls) - BULK_IMPORT_MAX_URLS)
+        urls = urls[:BULK_IMPORT_MAX_URLS]
+        logger.info(f"Bulk import request from user {user_id}: {len(urls)} URLs ({truncated} over the limit)")
+
+        result = await run_in_threadpool(start_bulk_import, user_id, urls)
+        result.update({"requested": len(urls), "truncated": truncated, "listing_errors": errors})
+        if result["rejected"]:
+            return JSONResponse(content=result, headers={"Retry-After": str(result["retry_after"])})
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk import error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/jobs/{job_id}/retry")
+def retry_job(job_id: str, user=Depends(get_current_user)):
+    """Re-run a failed import from its last checkpointed stage; its owner and watchers may retry it"""
+    try:
+        job = get_job(job_id)
+        if not job or not job_visible_to(job, user["user_id"]):
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] != "Failed":
+            raise HTTPException(status_code=409, detail=f"Only failed jobs can be retried (job is {job['status']})")
+        # One conditional update, so a concurrent import of the same video can't also be active
+        if not reactivate_failed_job(job_id, "Retrying from last checkpoint"):
+            active = find_active_job(job.get("dedupe_key") or job["url"])
+            if not active:
+                raise HTTPException(status_code=409, detail="Job could not be retried, please try again")
+            active_id, active_job = active
+            return {
+                "message": "Video is already being processed.",
+                "job_id": active_id,
+                "status": active_job["status"],
+                "progress": active_job.get("progress", 0)
+            }
+
+        try:
+            start_at = submit_import(job_id, job["user_id"], job["url"], resume=True, priority=PRIORITY_RETRY)
+        except QueueFullError as e:
+            update_job_progress(job_id, "Failed", job.get("progress", 0), queue_full_message(e))
+            raise HTTPException(
+                status_code=429,
+                detail=queue_full_message(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
+        logger.info(f"Retrying job {job_id} from stage {start_at}")
+        return {"message": "Retry started", "job_id": job_id, "status": "Queued", "progress": job.get("progress", 0), "resumed_from": start_at}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Job retry error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str, user=Depends(get_current_user)):
+    """
+    Cancel an import. A job still waiting in the scheduler is cancelled at
+    once; a running one stops at its next check (between stages, download
+    chunks, transcription chunks and LLM calls) and cleans up its files.
+
+    A watcher cancelling only detaches from the job, and the owner can't
+    cancel while other users are waiting on it.
+    """
+    try:
+        user_id = user["user_id"]
+        job = get_job(job_id)
+        if not job or not job_visible_to(job, user_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] in TERMINAL_STATUSES:
+            raise HTTPException(status_code=409, detail=f"Job has already finished (job is {job['status']})")
+        if user_id != job["user_id"]:
+            remove_job_watcher(job_id, user_id)
+            logger.info(f"User {user_id} stopped watching job {job_id}")
+            return {"message": "Import cancelled for you; it continues for the users who requested it",
+                    "job_id": job_id, "status": "Cancelled"}
+        if job.get("watchers"):
+            raise HTTPException(status_code=409, detail="Other users are waiting on this import, so it can't be cancelled")
+        request_cancel(job_id)
+        item = import_scheduler.remove(job_id) if IMPORT_MODE == "local" else None
+        if item is not None:
+            importer.handle_import_error(item[0], JobCancelled(f"Job {job_id} was cancelled"))
+            return {"message": "Import cancelled", "job_id": job_id, "status": "Cancelled"}
+        logger.info(f"Cancellation requested for job {job_id}")
+        return {"message": "Cancellation requested", "job_id": job_id, "status": job["status"]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Job cancel error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def job_status_payload(job_id: str, job: dict) -> dict:
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "progress": job.get("progress", 0),
+        "message": job.get("message", ""),
+        "url": job["url"],
+        "metrics": job.get("metrics") or {},
+        # Only known for jobs waiting in this process's scheduler
+        "queue_position": import_scheduler.queue_position(job_id)
+    }
+
 @app.post("/progress")
 async def get_progress(request: Request):
     try:
         data = await request.json()
         job_id = data.get("job_id")
         
-        job = get_job(job_id)
-        print(job)
+        job = await run_in_threadpool(get_job, job_id)
         if not job:
             return {"status": "not_found"}
            
@@ -262,40 +616,252 @@ async def get_progress(request: Request):
             "status": job["status"],
             "progress": job.get("progress", 0),
             "message": job.get("message", ""),
-            "url": job["url"]
+            "url": job["url"],
+            "metrics": job.get("metrics") or {},
+            "queue_position": import_scheduler.queue_position(job_id)
         }
     except Exception as e:
         logger.error(f"Progress check error: {str(e)}")
         return {"error": str(e)}
 
+@app.post("/progress/batch")
+def get_progress_batch(req: ProgressBatchRequest, user=Depends(get_current_user)):
+    """Status of many jobs in one request, for clients that must poll"""
+    try:
+        jobs = get_jobs(req.job_ids)
+        return {
+            "jobs": {
+                job_id: job_status_payload(job_id, jobs[job_id])
+                if job_id in jobs and job_visible_to(jobs[job_id], user["user_id"])
+                else {"job_id": job_id, "status": "not_found"}
+                for job_id in req.job_ids
+            }
+        }
+    except Exception as e:
+        logger.error(f"Batch progress check error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/progress/stream")
+async def stream_progress(request: Request, job_ids: Optional[str] = None, user=Depends(get_current_user)):
+    """
+    Server-Sent Events stream of the user's job progress.
+
+    Sends one "progress" event per status/progress change of any of the
+    user's jobs (or only job_ids, comma-separated). With job_ids the stream
+    ends with a "done" event once all of them have finished.
+    """
+    user_id = user["user_id"]
+    wanted = {j for j in job_ids.split(",") if j} if job_ids else None
+    if wanted is not None and len(wanted) > PROGRESS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {PROGRESS_BATCH_MAX} job ids per stream")
+
+    async def events():
+        queue = subscribe(user_id)
+        sent = {}
+        try:
+            initial = await run_in_threadpool(get_jobs_for_user, user_id)
+            if wanted is not None:
+                # Requested jobs may have finished outside the recent window
+                requested = await run_in_threadpool(get_jobs, list(wanted))
+                for job_id in list(wanted):
+                    job = requested.get(job_id)
+                    if job is None or not job_visible_to(job, user_id):
+                        wanted.discard(job_id)
+                        yield f"event: progress\ndata: {json.dumps({'job_id': job_id, 'status': 'not_found'})}\n\n"
+                    else:
+                        initial[job_id] = job
+            updates = list(initial.items())
+            while True:
+                for job_id, job in updates:
+                    if wanted is not None and job_id not in wanted:
+                        continue
+                    state = (job["status"], job.get("progress", 0), import_scheduler.queue_position(job_id))
+                    if sent.get(job_id) == state:
+                        continue
+                    sent[job_id] = state
+                    yield f"event: progress\ndata: {json.dumps(job_status_payload(job_id, job))}\n\n"
+                if wanted is not None and all(
+                    job_id in sent and sent[job_id][0] in TERMINAL_STATUSES for job_id in wanted
+                ):
+                    yield "event: done\ndata: {}\n\n"
+                    return
+                if await request.is_disconnected():
+                    return
+                try:
+                    updates = [await asyncio.wait_for(queue.get(), timeout=PROGRESS_STREAM_REFRESH)]
+                    while not queue.empty():
+                        updates.append(queue.get_nowait())
+                except asyncio.TimeoutError:
+                    # Keepalive, and pick up changes made by other API workers
+                    yield ": keepalive\n\n"
+                    updates = list((await run_in_threadpool(get_jobs_for_user, user_id)).items())
+        finally:
+            unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+VIDEO_PAGE_MAX = 200
+
+# Response keys of /videos, mapped to the db column each one is built from
+VIDEO_RESPONSE_FIELDS = {
+    "id": "id",
+    "url": "url",
+    "file_path": "file_path",
+    "transcript": "transcript",
+    "video_playcount": "video_playcount",
+    "video_diggcount": "video_diggcount",
+    "video_commentcount": "video_commentcount",
+    "video_sharecount": "video_sharecount",
+    "summary": "summary",
+    "description": "video_description",
+    "tags": "tags",
+    "niche": "niche",
+    "author_username": "author_username",
+    "author_name": "author_name",
+}
+
+def format_video(v: dict) -> dict:
+    """Shape a db video row for the /videos response, keeping only the selected columns"""
+    video = {}
+    for key, column in VIDEO_RESPONSE_FIELDS.items():
+        if column not in v:
+            continue
+        if key == "file_path":
+            video[key] = f"/videos/{os.path.basename(v['file_path']).replace(os.sep, '/')}"
+        else:
+            video[key] = v[column]
+    return video
+
 @app.post("/videos")
-def get_user_videos(user=Depends(get_current_user)):
+def get_user_videos(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """
+    List the user's videos, newest first.
+
+    limit/cursor page through the library by video id: the next cursor is
+    returned in the X-Next-Cursor header while more pages remain. fields is a
+    comma-separated subset of the response keys (e.g. to skip transcript and
+    summary in list views). Without parameters the full library is returned.
+    """
     try:
-        videos = db.get_videos_for_user(user["user_id"])
+        columns = None
+        if fields:
+            requested = [f.strip() for f in fields.split(",") if f.strip()]
+            unknown = [f for f in requested if f not in VIDEO_RESPONSE_FIELDS]
+            if unknown:
+                return JSONResponse(status_code=400, content={"error": f"Unknown fields: {', '.join(unknown)}"})
+            columns = [VIDEO_RESPONSE_FIELDS[f] for f in requested]
+        if limit is not None:
+            limit = max(1, min(limit, VIDEO_PAGE_MAX))
+
+        videos = db.get_videos_for_user(user["user_id"], limit=limit, before_id=cursor, fields=columns)
         logger.info(f"Retrieved videos for user {user['user_id']}")
-        return [
-            {
-                "id": v["id"],
-                "url": v["url"],
-                "file_path": f"/videos/{os.path.basename(v['file_path']).replace(os.sep, '/')}",
-                "transcript": v["transcript"],
-                "video_playcount": v["video_playcount"],
-                "video_diggcount": v["video_diggcount"],
-                "video_commentcount": v["video_commentcount"],
-                "video_sharecount": v["video_sharecount"],
-                "summary": v["summary"],
-                "description": v["video_description"],
-                "tags": v["tags"],
-                "niche":v["niche"],
-                "author_username":v["author_username"],
-                "author_name":v["author_name"],
-            }
-            for v in videos
-        ]
+        if limit is not None and len(videos) == limit:
+            response.headers["X-Next-Cursor"] = str(videos[-1]["id"])
+        return [format_video(v) for v in videos]
     except Exception as e:
         logger.error(f"Error getting user videos: {str(e)}")
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.get("/video/{video_id}/text")
+def get_user_video_text(video_id: int, user=Depends(get_current_user)):
+    """Transcript and summary of one video, for list views that skipped them"""
+    video = db.get_video_text(user["user_id"], video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return video
+
+COMMENT_PAGE_DEFAULT = 50
+COMMENT_PAGE_MAX = 200
+
+@app.get("/video/{video_id}/comments")
+def get_video_comments(
+    video_id: int,
+    response: Response,
+    limit: int = COMMENT_PAGE_DEFAULT,
+    cursor: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """
+    Stored comments on one of the user's videos, newest first.
+
+    The next cursor ("<create_time>:<cid>") is returned in the X-Next-Cursor
+    header while more pages remain.
+    """
+    before = None
+    if cursor:
+        create_time, _, cid = cursor.partition(":")
+        if not create_time.isdigit() or not cid:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        before = (int(create_time), cid)
+    try:
+        if not db.get_linked_video(user["user_id"], video_id):
+            raise HTTPException(status_code=404, detail="Video not found")
+        limit = max(1, min(limit, COMMENT_PAGE_MAX))
+        rows = db.get_comments_for_video(user["user_id"], video_id, limit, before=before)
+        if len(rows) == limit:
+            response.headers["X-Next-Cursor"] = f"{rows[-1]['create_time']}:{rows[-1]['cid']}"
+        return rows
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting comments for video {video_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/video/{video_id}/comments/refresh")
+def refresh_video_comments(video_id: int, user=Depends(get_current_user)):
+    """Fetch the comments posted since the last refresh and store them"""
+    try:
+        video = db.get_linked_video(user["user_id"], video_id)
+        if not video:
+            raise HTTPException(status_code=404, detail="Video not found")
+        if not video["video_id"]:
+            raise HTTPException(status_code=409, detail="Video has no TikTok id to fetch comments for")
+        return comments.ingest_comments(video)
+    except HTTPException:
+        raise
+    except concurrent.futures.TimeoutError:
+        logger.warning(f"Comment refresh for video {video_id} timed out")
+        raise HTTPException(status_code=504, detail="Timed out fetching comments from TikTok")
+    except Exception as e:
+        logger.error(f"Error refreshing comments for video {video_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+STATS_HISTORY_MAX = 500
+
+@app.get("/video/{video_id}/stats")
+def get_video_stats(video_id: int, limit: int = 100, user=Depends(get_current_user)):
+    """
+    Stats snapshots of one of the user's videos, newest first, with play
+    and like growth per hour across the returned window.
+    """
+    try:
+        if not db.get_linked_video(user["user_id"], video_id):
+            raise HTTPException(status_code=404, detail="Video not found")
+        history = db.get_video_stats_history(user["user_id"], video_id, max(2, min(limit, STATS_HISTORY_MAX)))
+        growth = {}
+        if len(history) >= 2:
+            newest, oldest = history[0], history[-1]
+            hours = (newest["captured_at"] - oldest["captured_at"]).total_seconds() / 3600
+            for key in ("playcount", "diggcount"):
+                if hours > 0 and newest[key] is not None and oldest[key] is not None:
+                    growth[f"{key}_per_hour"] = round((newest[key] - oldest[key]) / hours, 2)
+        return {"history": history, "growth": growth}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting stats for video {video_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.post("/query")
 def query_video(req: QueryRequest, user=Depends(get_current_user)):
     try:
@@ -306,181 +872,6 @@ def query_video(req: QueryRequest, user=Depends(get_current_user)):
         logger.error(f"Query error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-def import_worker(job_id: str,user_id, url):
-    try:
-        update_job_progress(job_id, "Downloading", 10, "Starting download")
-        logger.info(f"Starting download for URL: {url}")
-        
-        existing = db.get_video_by_url(url)
-        print("DB BACK:",existing)
-        if existing:
-            print("inside f")
-            print (type(user_id))
-            print (type(existing["id"]))
-            db.link_user_video(user_id, existing["id"])
-            print("vidoe linked")
-            update_job_progress(job_id, "Completed", 100, "Video already existed - linked to account")
-            logger.info(f"Video already exists, linked to user: {url}")
-            return
-
-        file_path, metadata = None, None
-        for attempt in range(MAX_RETRIES):
-            try:
-                update_job_progress(job_id, "Downloading", 15 + attempt*5, f"Download attempt {attempt+1}")
-                file_path, metadata = download.download_video(url)
-                if not os.path.exists(file_path) or os.path.getsize(file_path) < 1000:
-                    raise Exception("Download failed or returned small file")
-                break
-            except Exception as e:
-                logger.warning(f"[Download Retry {attempt+1}] Error: {e}")
-        else:
-            error_msg = "Failed to download video after retries"
-            update_job_progress(job_id, "Failed", 0, error_msg)
-            logger.error(error_msg)
-            raise Exception(error_msg)
-        update_job_progress(job_id, "Transcribing", 40, "Starting transcription")
-        logger.info(f"Starting transcription for URL: {url}")
-        transcript = ""
-        for attempt in range(MAX_RETRIES):
-            try:
-                update_job_progress(job_id, "Transcribing", 45 + attempt*5, f"Transcription attempt {attempt+1}")
-
-                transcript = transcribe.transcribe_audio(file_path)
-                if transcript.strip() == "":
-                    raise Exception("Empty transcript")
-                print(transcript)
-                break
-            except Exception as e:
-                logger.warning(f"[Transcription Retry {attempt+1}] Error: {e}")
-        else:
-            error_msg = "Failed to transcribe video after retries"
-            logger.error(error_msg)
-            update_job_progress(job_id, "Failed", 40, error_msg)
-            raise Exception(error_msg)
-        update_job_progress(job_id, "Analyzing", 70, "Generating summary and tags")
-        summary_tags_prompt = f"""
-You are a content summarizer for short videos. Given the transcript below, produce:
-
-1. A concise 2-3 sentence summary of what the video is about.
-2. A list of 10 relevant tags (hashtags or keywords) describing the video content with the "#" format.
-3. Identify only 1 best hooks from the transcript of the video with hook title and hook text. and also rank the confidence score of the hooks from 0-1)
-4. Classify the style of the video by analyzing, what category/niche it belongs , from the following provided:
-{{1: Voice-over
--------------
-Narration explaining visuals or storytelling.
-Used for tutorials, behind-the-scenes, etc.
-
-2: Talking Head
----------------
-Person speaking directly to the camera.
-Often includes opinions, advice, or promotional content.
-
-3: Podcast
-----------
-Conversational or interview-style format.
-Includes back-and-forth dialogue or monologues.
-
-4: Educational
---------------
-Step-by-step guides or knowledge-based explanations.
-Uses clear structure like “Step 1... Step 2...” or “Here’s how…”
-
-5: Storytime
-------------
-Personal narratives, often starting with a hook.
-Structured in beginning–middle–end format.
-
-4: Commentary
--------------
-Creator gives opinion on a topic or video.
-Often includes phrases like “Let’s talk about…” or “Here’s what I think…”
-
-5: Listicle
------------
-Structured as “Top 5 tips…” or “3 things you didn’t know…”
-Uses numbered sections or predictable format.
-
-6: Motivational
----------------
-Uplifting speeches or affirmations.
-Format: “You are capable of…” or “Don’t give up…”
-
-7: Promotional
---------------
-Clear CTA, product/service mention, benefit-focused.
-Format: “Introducing…”, “You need this because…”}}
-
-Transcript:
-{transcript}
-
-Return your response in dict format:
-  {{"summary": "video-summary",
-  "tags": ["tag1", "tag2"],
-  "hooks":{{
-      "hook-title":["title1","title2"],
-      "hook-text":["tex1","text2"],
-      "confidence-score":["score1","score2","score3"]}}
-  }},
-  Niche:"video-niche" """
-        summary = ""
-        tags = []
-        for attempt in range(MAX_RETRIES):
-            try:
-                update_job_progress(job_id, "Analyzing", 75 + attempt*5, f"Analysis attempt {attempt+1}")
-
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You summarize TikTok transcripts into 2-3 lines."},
-                        {"role": "user", "content": summary_tags_prompt}
-                    ],
-                )
-                response = response.choices[0].message.content.strip()
-                response = re.search(r'```json(.*?)```', response, re.DOTALL)
-                response = response.group(1).strip()
-                logger.debug(f"GPT response: {response}")
-                data = json.loads(response)
-                summary = data["summary"]
-                tags = data["tags"]
-                niche=data["Niche"]
-                print(niche)
-                break
-            except Exception as e:
-                logger.warning(f"[Summary Retry {attempt+1}] Error: {e}")
-        else:
-            error_msg = "Failed to get summary after retries"
-            update_job_progress(job_id, "Failed", 70, error_msg)
-            logger.error(error_msg)
-            raise Exception(error_msg)
-        try:
-            update_job_progress(job_id, "Saving", 90, "Saving video data")
-            video_id = db.add_video_record(url, file_path, transcript, metadata, summary, tags,niche)
-            logger.info(f"Successfully added video record for URL: {url}")
-            db.link_user_video(user_id, video_id)
-            for title, text, score in zip(
-                data["hooks"]["hook-title"],
-                data["hooks"]["hook-text"],
-                data["hooks"]["confidence-score"]
-            ):
-                highlight_id = add_highlight(
-                    user_id=user_id,
-                    video_id=video_id,
-                    title=title,
-                    text=text,
-                    color="yellow",
-                    confidence_score=float(score)
-                )
-        except Exception as e:
-            logger.error(f"Video Saving failed: {e}")
-        add_new_transcript(transcript,video_id)
-        logger.info(f"Added transcript to vector DB for video ID: {video_id}")
-        update_job_progress(job_id, "Completed", 100, "Video processing completed")
-        logger.info(f"Video processing completed for URL: {url}")
-    except Exception as e:
-        error_msg = f"Failed to process video {url}: {str(e)}"
-        logger.error(error_msg)
-        update_job_progress(job_id, "Failed", 0, error_msg)
-
 @app.post("/query_across_videos")
 def query_across_videos(req: CrossVideoQueryRequest, user=Depends(get_current_user)):
     try:
@@ -492,9 +883,9 @@ def query_across_videos(req: CrossVideoQueryRequest, user=Depends(get_current_us
         raise HTTPException(status_code=500, detail="Internal server error")
         
 @app.post("/highlights/")
-async def create_highlight(highlight: HighlightCreate, db=Depends(db.get_db), user=Depends(get_current_user)):
+async def create_highlight(highlight: HighlightCreate, user=Depends(get_current_user)):
     try:
-        highlight_id = add_highlight(
+        highlight_id = await add_highlight_async(
             user_id=user["user_id"],
             video_id=highlight.video_id,
             title=highlight.title,
@@ -509,9 +900,9 @@ async def create_highlight(highlight: HighlightCreate, db=Depends(db.get_db), us
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/highlights/{video_id}")
-async def get_highlights(video_id: int, db=Depends(db.get_db), user=Depends(get_current_user)):
+async def get_highlights(video_id: int, user=Depends(get_current_user)):
     try:
-        highlights = get_highlights_for_video(user["user_id"], video_id)
+        highlights = await get_highlights_for_video_async(user["user_id"], video_id)
         logger.debug(f"Retrieved highlights for video {video_id}")
         return {"highlights": highlights}
     except Exception as e:
@@ -522,11 +913,10 @@ async def get_highlights(video_id: int, db=Depends(db.get_db), user=Depends(get_
 async def update_highlights(
     highlight_id: int, 
     highlight: HighlightUpdate, 
-    db=Depends(db.get_db), 
     user=Depends(get_current_user)
 ):
     try:
-        success = update_highlight(
+        success = await update_highlight_async(
             highlight_id=highlight_id,
             title=highlight.title,
             color=highlight.color
@@ -541,9 +931,9 @@ async def update_highlights(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.delete("/highlights/{highlight_id}")
-async def delete_highlights(highlight_id: int, db=Depends(db.get_db), user=Depends(get_current_user)):
+async def delete_highlights(highlight_id: int, user=Depends(get_current_user)):
     try:
-        success = delete_highlight(highlight_id)
+        success = await delete_highlight_async(highlight_id)
         if not success:
             logger.warning(f"Highlight not found for deletion: {highlight_id}")
             raise HTTPException(status_code=404, detail="Highlight not found")
@@ -618,6 +1008,34 @@ def get_collection_videos(collection_id: int):
         logger.error(f"Get collection videos error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/metrics/db")
+def db_metrics(user=Depends(get_current_user)):
+    return {"pool": db.get_pool_stats()}
+
+@app.get("/metrics/jobs")
+def job_metrics(user=Depends(get_current_user)):
+    return {"jobs": get_job_stats()}
+
+@app.get("/metrics/pipeline")
+def pipeline_metrics(user=Depends(get_current_user)):
+    """Queue depth, busy workers and throughput per import stage, plus the fair scheduler's backlog"""
+    return {"stages": import_pipeline.stats(), "scheduler": import_scheduler.stats()}
+
+@app.get("/metrics/rate_limit")
+def rate_limit_metrics(user=Depends(get_current_user)):
+    """Current adaptive rate, throttle count and wait times per TikTok egress"""
+    return {"egress": tiktok_limiter.stats()}
+
+@app.get("/metrics/tiktok_sessions")
+def tiktok_session_metrics(user=Depends(get_current_user)):
+    """Open, idle and recycled TikTokApi browser sessions in the shared pool"""
+    return session_pool.stats()
+
+@app.get("/metrics/stats_refresh")
+def stats_refresh_metrics(user=Depends(get_current_user)):
+    """Batches, refreshed and failed videos of the background stats refresher"""
+    return stats_refresher.stats()
+
 @app.get("/check-auth")
 def check_auth(user=Depends(get_current_user)):
     logger.debug(f"Auth check for user {user['email']}")
@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+_STOP = object()
+
+class Defer:
+    """Handler result asking for the item to re-enter the same stage after delay seconds.
+
+    The item waits on the pipeline's timer instead of occupying a worker
+    (e.g. for a rate limiter slot).
+    """
+    __slots__ = ("item", "delay")
+
+    def __init__(self, item, delay: float):
+        self.item = item
+        self.delay = delay
+
+class Stage:
+    """One pipeline stage: a bounded input queue drained by its own worker threads.
+
+    handler(item) returns the item for the next stage, None when the item
+    is finished early (e.g. the video already existed), or a Defer to run the
+    item through this stage again later.
+    """
+    def __init__(self, name: str, handler: Callable[[Any], Any], workers: int, queue_size: int):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.deferred = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": self.queue.qsize(),
+                "queue_capacity": self.queue.maxsize,
+                "workers": self.workers,
+                "busy": self.busy,
+                "processed": self.processed,
+                "failed": self.failed,
+                "deferred": self.deferred,
+            }
+
+class Pipeline:
+    """Chain of stages with per-stage concurrency and backpressure.
+
+    A worker hands its result to the next stage with a blocking put, so a full
+    downstream queue stalls the upstream stage instead of piling up work.
+    on_error(item, exc) is called when a handler raises; on_done(item) after
+    an item leaves the pipeline for any reason.
+    """
+    def __init__(self, stages: List[Stage],
+                 on_error: Callable[[Any, Exception], None] = None,
+                 on_done: Callable[[Any], None] = None):
+        self.stages = stages
+        self._index = {stage.name: i for i, stage in enumerate(stages)}
+        self._on_error = on_error
+        self._on_done = on_done
+        self._stopping = threading.Event()
+        # Deferred items: heap of (due, seq, stage index, item) drained by one timer thread
+        self._timers = []
+        self._timer_seq = itertools.count()
+        self._timer_cond = threading.Condition()
+        self._timer_thread = threading.Thread(target=self._run_timers, name="pipeline-timers", daemon=True)
+
+    def start(self):
+        for i, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(i,), name=f"pipeline-{stage.name}-{n}", daemon=True
+                )
+                thread.start()
+                stage.threads.append(thread)
+        self._timer_thread.start()
+        logger.info("Pipeline started: " + ", ".join(f"{s.name}x{s.workers}" for s in self.stages))
+
+    def submit(self, item, start_at: Optional[str] = None, block: bool = False, timeout: float = None):
+        """Queue an item at the first stage (or start_at); raises queue.Full when it has no room"""
+        if self._stopping.is_set():
+            raise RuntimeError("Pipeline is shutting down")
+        stage = self.stages[self._index[start_at] if start_at else 0]
+        stage.queue.put(item, block=block, timeout=timeout)
+
+    def _forward(self, index: int, item) -> bool:
+        """Blocking hand-off to stage index; gives up only when shutting down"""
+        target = self.stages[index].queue
+        while not self._stopping.is_set():
+            try:
+                target.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _defer(self, index: int, item, delay: float):
+        with self._timer_cond:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._timer_seq), index, item))
+            self._timer_cond.notify()
+
+    def _run_timers(self):
+        with self._timer_cond:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                if not self._timers or self._timers[0][0] > now:
+                    self._timer_cond.wait(self._timers[0][0] - now if self._timers else None)
+                    continue
+                due, seq, index, item = heapq.heappop(self._timers)
+                try:
+                    self.stages[index].queue.put_nowait(item)
+                except queue.Full:
+                    # Don't block the other timers on one full stage; try again shortly
+                    heapq.heappush(self._timers, (now + 0.5, seq, index, item))
+
+    def _finish(self, item):
+        if self._on_done:
+            try:
+                self._on_done(item)
+            except Exception as e:
+                logger.error(f"Pipeline on_done callback failed: {str(e)}", exc_info=True)
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                break
+            with stage._lock:
+                stage.busy += 1
+            try:
+                result = stage.handler(item)
+            except Exception as e:
+                with stage._lock:
+                    stage.failed += 1
+                logger.error(f"[{stage.name}] stage failed: {str(e)}")
+                if self._on_error:
+                    try:
+                        self._on_error(item, e)
+                    except Exception as callback_error:
+                        logger.error(f"Pipeline on_error callback failed: {str(callback_error)}", exc_info=True)
+                self._finish(item)
+                continue
+            finally:
+                with stage._lock:
+                    stage.busy -= 1
+            if isinstance(result, Defer):
+                with stage._lock:
+                    stage.deferred += 1
+                self._defer(index, result.item, result.delay)
+                continue
+            with stage._lock:
+                stage.processed += 1
+            if result is None or index == len(self.stages) - 1:
+                self._finish(result if result is not None else item)
+            elif not self._forward(index + 1, result):
+                logger.warning(f"[{stage.name}] dropped item during shutdown")
+                self._finish(result)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {stage.name: dict(stage.stats(), waiting=0) for stage in self.stages}
+        with self._timer_cond:
+            for _, _, index, _ in self._timers:
+                stats[self.stages[index].name]["waiting"] += 1
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        self._stopping.set()
+        with self._timer_cond:
+            if self._timers:
+                logger.warning(f"Abandoned {len(self._timers)} deferred items on shutdown")
+            self._timers.clear()
+            self._timer_cond.notify()
+        for stage in self.stages:
+            # Unstarted items are abandoned; a persistent job store resumes them on the next start
+            abandoned = 0
+            while True:
+                try:
+                    stage.queue.get_nowait()
+                    abandoned += 1
+                except queue.Empty:
+                    break
+            if abandoned:
+                logger.warning(f"[{stage.name}] abandoned {abandoned} queued items on shutdown")
+            for _ in stage.threads:
+                stage.queue.put(_STOP)
+        if wait:
+            for stage in self.stages:
+                for thread in stage.threads:
+                    thread.join()
+        logger.info("Pipeline stopped")
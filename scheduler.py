@@ -0,0 +1,192 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+class QueueFullError(Exception):
+    """Raised when the scheduler, or one user's share of it, is full; retry_after is in seconds"""
+    def __init__(self, retry_after: int, user_limit: bool = False):
+        super().__init__(f"Import queue is full{' for this user' if user_limit else ''}, retry in {retry_after}s")
+        self.retry_after = retry_after
+        self.user_limit = user_limit
+
+class FairScheduler:
+    """Per-user fair-share queue in front of the import pipeline.
+
+    Jobs wait in one queue per user per priority level. A dispatcher thread
+    hands them to dispatch(item) (a blocking pipeline submit, so the
+    pipeline's backpressure holds jobs here where ordering is fair), taking
+    the highest priority level first and rotating round-robin between users
+    within a level. A user never has more than per_user_limit jobs in the
+    pipeline at once, nor more than per_user_depth waiting, so one user's
+    backlog can't take every admission slot. Call job_finished(user_id) when
+    a dispatched job leaves the pipeline.
+    """
+    def __init__(self, dispatch: Callable[[Any], None], max_depth: int, per_user_limit: int, parallelism: int,
+                 per_user_depth: Optional[int] = None):
+        self._dispatch = dispatch
+        self._max_depth = max_depth
+        self._per_user_limit = per_user_limit
+        self._per_user_depth = per_user_depth or max_depth
+        self._queued_by_user: Dict[int, int] = {}
+        self._parallelism = max(1, parallelism)
+        # priority -> user_id -> deque of (job_id, item); OrderedDict order is the round-robin order
+        self._levels: Dict[int, "OrderedDict[int, deque]"] = {}
+        self._where: Dict[str, tuple] = {}  # job_id -> (priority, user_id)
+        self._in_flight: Dict[int, int] = {}
+        self._dispatched_at: Dict[str, float] = {}
+        self._avg_job_seconds = 60.0
+        self._depth = 0
+        self._rejected = 0
+        self._dispatched = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="fair-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    def retry_after(self) -> int:
+        """Rough seconds until a queue slot frees up"""
+        return min(600, max(5, math.ceil(self._avg_job_seconds / self._parallelism)))
+
+    def _user_retry_after(self) -> int:
+        # A user's queue drains per_user_limit jobs at a time
+        return min(600, max(5, math.ceil(self._avg_job_seconds / max(1, self._per_user_limit))))
+
+    def _dequeued_locked(self, user_id: int):
+        self._depth -= 1
+        self._queued_by_user[user_id] -= 1
+        if not self._queued_by_user[user_id]:
+            del self._queued_by_user[user_id]
+
+    def submit(self, job_id: str, user_id: int, item, priority: int = 0, force: bool = False) -> int:
+        """
+        Queue a job; returns its queue position. Raises QueueFullError at max
+        depth, or when the user already has per_user_depth jobs waiting
+        (user_limit set), unless force.
+        """
+        with self._cond:
+            if not force and self._queued_by_user.get(user_id, 0) >= self._per_user_depth:
+                self._rejected += 1
+                raise QueueFullError(self._user_retry_after(), user_limit=True)
+            if not force and self._depth >= self._max_depth:
+                self._rejected += 1
+                raise QueueFullError(self.retry_after())
+            users = self._levels.setdefault(priority, OrderedDict())
+            users.setdefault(user_id, deque()).append((job_id, item))
+            self._where[job_id] = (priority, user_id)
+            self._depth += 1
+            self._queued_by_user[user_id] = self._queued_by_user.get(user_id, 0) + 1
+            self._cond.notify_all()
+            return self._position_locked(job_id)
+
+    def remove(self, job_id: str):
+        """Drop a job that has not been dispatched yet; returns its item, or None if it is not waiting"""
+        with self._cond:
+            where = self._where.pop(job_id, None)
+            if where is None:
+                return None
+            priority, user_id = where
+            users = self._levels[priority]
+            jobs = users[user_id]
+            entry = next(entry for entry in jobs if entry[0] == job_id)
+            jobs.remove(entry)
+            if not jobs:
+                del users[user_id]
+                if not users:
+                    del self._levels[priority]
+            self._dequeued_locked(user_id)
+            return entry[1]
+
+    def job_finished(self, user_id: int, job_id: Optional[str] = None):
+        with self._cond:
+            if self._in_flight.get(user_id, 0) > 0:
+                self._in_flight[user_id] -= 1
+                if not self._in_flight[user_id]:
+                    del self._in_flight[user_id]
+            started = self._dispatched_at.pop(job_id, None)
+            if started is not None:
+                self._avg_job_seconds = 0.9 * self._avg_job_seconds + 0.1 * (time.time() - started)
+            self._cond.notify_all()
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based estimate of how many jobs will be dispatched before this one finishes waiting"""
+        with self._cond:
+            return self._position_locked(job_id) if job_id in self._where else None
+
+    def _position_locked(self, job_id: str) -> int:
+        priority, user_id = self._where[job_id]
+        index = next(i for i, entry in enumerate(self._levels[priority][user_id]) if entry[0] == job_id)
+        ahead = sum(
+            len(jobs) for level, users in self._levels.items() if level > priority for jobs in users.values()
+        )
+        # Round-robin: every other user at this level gets up to index + 1 turns first
+        ahead += index + sum(
+            min(len(jobs), index + 1) for other, jobs in self._levels[priority].items() if other != user_id
+        )
+        return ahead + 1
+
+    def _next_locked(self):
+        for priority in sorted(self._levels, reverse=True):
+            users = self._levels[priority]
+            for user_id in list(users):
+                if self._in_flight.get(user_id, 0) >= self._per_user_limit:
+                    continue
+                job_id, item = users[user_id].popleft()
+                if users[user_id]:
+                    users.move_to_end(user_id)
+                else:
+                    del users[user_id]
+                if not users:
+                    del self._levels[priority]
+                del self._where[job_id]
+                self._dequeued_locked(user_id)
+                self._in_flight[user_id] = self._in_flight.get(user_id, 0) + 1
+                self._dispatched_at[job_id] = time.time()
+                self._dispatched += 1
+                return job_id, user_id, item
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                entry = None
+                while not self._stopping:
+                    entry = self._next_locked()
+                    if entry is not None:
+                        break
+                    self._cond.wait()
+                if self._stopping:
+                    return
+            job_id, user_id, item = entry
+            try:
+                self._dispatch(item)
+            except Exception as e:
+                logger.error(f"Scheduler dispatch failed for job {job_id}: {str(e)}", exc_info=True)
+                self.job_finished(user_id, job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": self._depth,
+                "max_depth": self._max_depth,
+                "per_user_limit": self._per_user_limit,
+                "per_user_depth": self._per_user_depth,
+                "queued_by_user": dict(self._queued_by_user),
+                "in_flight_by_user": dict(self._in_flight),
+                "dispatched": self._dispatched,
+                "rejected": self._rejected,
+                "avg_job_seconds": round(self._avg_job_seconds, 1),
+            }
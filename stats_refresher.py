@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+import db
+import download
+from utils.rate_limit import TokenBucket
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+# === Settings ===
+STATS_REFRESH_BATCH = settings.get("STATS_REFRESH_BATCH", 50)  # videos claimed and written per batch
+STATS_REFRESH_WORKERS = settings.get("STATS_REFRESH_WORKERS", 2)  # metadata fetches in flight
+STATS_REFRESH_RATE = settings.get("STATS_REFRESH_RATE", 0.5)  # fetches per second, on top of the shared TikTok limiter
+STATS_REFRESH_IDLE_WAIT = settings.get("STATS_REFRESH_IDLE_WAIT", 300)  # seconds to sleep when nothing is due
+STATS_REFRESH_LEASE = settings.get("STATS_REFRESH_LEASE", 3600)  # seconds before a failed fetch is retried
+STATS_REFRESH_MIN_INTERVAL = settings.get("STATS_REFRESH_MIN_INTERVAL", 3600)  # seconds between refreshes of one video
+STATS_REFRESH_MAX_INTERVAL = settings.get("STATS_REFRESH_MAX_INTERVAL", 7 * 86400)
+STATS_HOT_VELOCITY = settings.get("STATS_HOT_VELOCITY", 1000)  # plays/hour above which refreshes speed up
+
+def next_refresh_seconds(age_seconds: float, velocity: Optional[float]) -> float:
+    """
+    Seconds until a video is due again: one minimum interval per day since
+    import, divided down for videos gaining more than STATS_HOT_VELOCITY
+    plays an hour, clamped to the min/max intervals.
+    """
+    interval = STATS_REFRESH_MIN_INTERVAL * max(1.0, age_seconds / 86400)
+    if velocity:
+        interval /= max(1.0, velocity / STATS_HOT_VELOCITY)
+    return max(STATS_REFRESH_MIN_INTERVAL, min(STATS_REFRESH_MAX_INTERVAL, interval))
+
+class StatsRefresher:
+    """Background refresh of engagement counters for stored videos.
+
+    Each batch claims the most overdue videos (db.claim_stats_batch, safe to
+    run in several processes), fetches their metadata only, paced by its own
+    token bucket as well as the shared TikTok limiter, and writes the whole
+    batch with db.save_video_stats. Due times come from next_refresh_seconds,
+    so recently imported and fast-growing videos come round first.
+    """
+    def __init__(self, batch_size: int = STATS_REFRESH_BATCH, workers: int = STATS_REFRESH_WORKERS,
+                 rate: float = STATS_REFRESH_RATE):
+        self._batch_size = batch_size
+        self._workers = workers
+        self._bucket = TokenBucket(rate, burst=max(1, workers))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stats-refresher", daemon=True)
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "refreshed": 0, "failed": 0, "last_batch_at": None}
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _fetch(self, video: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        delay = self._bucket.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            metadata = download.fetch_metadata(video["url"])
+        except Exception as e:
+            logger.warning(f"Stats refresh failed for video {video['id']}: {str(e)}")
+            return None
+        velocity = None
+        hours = float(video["since_refresh_seconds"] or 0) / 3600
+        if hours > 0 and metadata.video_playcount is not None and video["video_playcount"] is not None:
+            velocity = (metadata.video_playcount - video["video_playcount"]) / hours
+        return {
+            "id": video["id"],
+            "playcount": metadata.video_playcount,
+            "diggcount": metadata.video_diggcount,
+            "commentcount": metadata.video_commentcount,
+            "sharecount": metadata.video_sharecount,
+            "velocity": velocity,
+            "next_refresh_seconds": next_refresh_seconds(float(video["age_seconds"] or 0), velocity),
+        }
+
+    def run_batch(self) -> int:
+        """Refresh one batch; returns how many videos were claimed"""
+        videos = db.claim_stats_batch(self._batch_size, STATS_REFRESH_LEASE)
+        if not videos:
+            return 0
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="stats-fetch") as executor:
+            results = list(executor.map(self._fetch, videos))
+        stats = [r for r in results if r]
+        db.save_video_stats(stats)
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["refreshed"] += len(stats)
+            self._stats["failed"] += len(videos) - len(stats)
+            self._stats["last_batch_at"] = time.time()
+        logger.info(f"Refreshed stats for {len(stats)} of {len(videos)} videos")
+        return len(videos)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_batch()
+            except Exception as e:
+                logger.error(f"Stats refresh batch failed: {str(e)}")
+                claimed = 0
+            # A full batch means more are probably due; otherwise wait for the next ones
+            if claimed < self._batch_size:
+                self._stop.wait(STATS_REFRESH_IDLE_WAIT)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["bucket"] = self._bucket.stats()
+        return stats
@@ -1,6 +1,9 @@
 import openai
 import os
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pydub import AudioSegment
 from moviepy import VideoFileClip
 from utils.utils import get_settings, get_logger
@@ -17,6 +20,13 @@ CHUNK_DURATION_MS = settings.get("CHUNK_DURATION_MS", 5 * 60 * 1000)  # 5 minute
 TEMP_DIR = settings.get("TEMP_DIR", "./videos/temp")
 AUDIO_BITRATE = settings.get("AUDIO_BITRATE", "64k")
 WHISPER_MODEL = settings.get("WHISPER_MODEL", "whisper-1")
+TRANSCRIBE_JOB_CONCURRENCY = settings.get("TRANSCRIBE_JOB_CONCURRENCY", 3)  # chunks of one video transcribed at once
+TRANSCRIBE_GLOBAL_CONCURRENCY = settings.get("TRANSCRIBE_GLOBAL_CONCURRENCY", 8)  # Whisper requests in flight per process
+TRANSCRIBE_CHUNK_RETRIES = settings.get("TRANSCRIBE_CHUNK_RETRIES", 3)  # attempts per chunk
+TRANSCRIBE_RETRY_BACKOFF = settings.get("TRANSCRIBE_RETRY_BACKOFF", 2)  # seconds, doubled per attempt
+
+# Shared by every job, so concurrent imports can't exceed the Whisper request budget
+_whisper_slots = threading.BoundedSemaphore(TRANSCRIBE_GLOBAL_CONCURRENCY)
 
 def extract_audio(video_path, output_format="mp3"):
     """Extract audio from video and return path to audio file."""
@@ -72,41 +82,104 @@ def transcribe_chunk(file_path):
         logger.error(f"Error transcribing chunk {file_path}: {str(e)}", exc_info=True)
         raise
 
+def prepare_audio_chunks(video_path):
+    """CPU part of the pipeline: extract audio and split it into chunk files.
+
+    Returns (audio_path, chunk_paths); remove them with cleanup_audio_files.
+    """
+    audio_path = extract_audio(video_path)
+    try:
+        chunks = split_audio(audio_path, CHUNK_DURATION_MS)
+    except Exception:
+        cleanup_audio_files(audio_path, [])
+        raise
+    return audio_path, chunks
+
+def transcribe_chunk_with_retries(index, file_path, cancel_check=None):
+    """Transcribe one chunk, retrying it on its own with backoff.
+
+    Returns (text, seconds taken by the successful request, attempts); text
+    and seconds are None if every attempt failed.
+    """
+    for attempt in range(1, TRANSCRIBE_CHUNK_RETRIES + 1):
+        if cancel_check is not None:
+            cancel_check()
+        try:
+            with _whisper_slots:
+                started = time.monotonic()
+                text = transcribe_chunk(file_path)
+            return text, time.monotonic() - started, attempt
+        except Exception as e:
+            logger.warning(f"[Chunk {index + 1} attempt {attempt}] Transcription failed: {str(e)}")
+            if attempt < TRANSCRIBE_CHUNK_RETRIES:
+                time.sleep(TRANSCRIBE_RETRY_BACKOFF * 2 ** (attempt - 1))
+    logger.error(f"Failed to transcribe chunk {index + 1} after {TRANSCRIBE_CHUNK_RETRIES} attempts")
+    return None, None, TRANSCRIBE_CHUNK_RETRIES
+
+def transcribe_chunks(chunks, cancel_check=None, progress_callback=None):
+    """API part of the pipeline: transcribe chunk files concurrently and combine them in order.
+
+    Up to TRANSCRIBE_JOB_CONCURRENCY chunks of one call are in flight, and at
+    most TRANSCRIBE_GLOBAL_CONCURRENCY Whisper requests across the process.
+    A chunk that still fails after its retries is left out. cancel_check()
+    runs before each request and may raise to abort. progress_callback(stats)
+    gets chunks_done, chunks_total, chunk_seconds and attempts as each chunk
+    finishes, then once more with done and the per-chunk latencies in order.
+    """
+    logger.info(f"Beginning transcription of {len(chunks)} chunks")
+    started = time.monotonic()
+    texts = [None] * len(chunks)
+    latencies = [None] * len(chunks)
+    retries = 0
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(TRANSCRIBE_JOB_CONCURRENCY, len(chunks))),
+                                  thread_name_prefix="transcribe-chunk")
+    try:
+        futures = {
+            executor.submit(transcribe_chunk_with_retries, i, chunk_path, cancel_check): i
+            for i, chunk_path in enumerate(chunks)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            texts[i], latencies[i], attempts = future.result()
+            retries += attempts - 1
+            logger.info(f"Finished chunk {i + 1}/{len(chunks)} ({done} done)")
+            if progress_callback is not None:
+                progress_callback({"chunks_done": done, "chunks_total": len(chunks),
+                                   "chunk_seconds": latencies[i], "attempts": attempts, "done": False})
+    finally:
+        # On cancellation, drop the chunks not started yet
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    if progress_callback is not None:
+        progress_callback({"chunks_done": len(chunks), "chunks_total": len(chunks),
+                           "chunk_seconds": [round(s, 3) if s is not None else None for s in latencies],
+                           "seconds": round(time.monotonic() - started, 3), "retries": retries,
+                           "failed": texts.count(None), "done": True})
+    full_transcript = "".join(text + "\n" for text in texts if text is not None)
+    logger.debug(f"Transcript length: {len(full_transcript)} characters")
+    return full_transcript.strip()
+
+def cleanup_audio_files(audio_path, chunks):
+    """Remove the temporary audio file and chunk files, ignoring ones already gone."""
+    for path in list(chunks) + [audio_path]:
+        try:
+            os.remove(path)
+            logger.debug(f"Removed temporary audio file: {path}")
+        except FileNotFoundError:
+            pass
+
 def transcribe_audio(video_path):
     """Full pipeline: extract, split, transcribe, combine."""
     try:
         logger.info(f"Starting transcription pipeline for: {video_path}")
-        
-        # Extract audio
-        audio_path = extract_audio(video_path)
-        
-        # Split audio
-        chunks = split_audio(audio_path, CHUNK_DURATION_MS)
-        
-        # Transcribe chunks
-        full_transcript = ""
-        logger.info(f"Beginning transcription of {len(chunks)} chunks")
-        
-        for i, chunk_path in enumerate(chunks, 1):
-            logger.info(f"Processing chunk {i}/{len(chunks)}")
-            try:
-                chunk_text = transcribe_chunk(chunk_path)
-                full_transcript += chunk_text + "\n"
-                # Clean up chunk file immediately after processing
-                os.remove(chunk_path)
-                logger.debug(f"Removed temporary chunk file: {chunk_path}")
-            except Exception as e:
-                logger.error(f"Failed to transcribe chunk {i}: {str(e)}")
-                continue  # Continue with next chunk even if one fails
-        
-        # Clean up audio file
-        os.remove(audio_path)
-        logger.debug(f"Removed temporary audio file: {audio_path}")
-        
+        audio_path, chunks = prepare_audio_chunks(video_path)
+        try:
+            transcript = transcribe_chunks(chunks)
+        finally:
+            cleanup_audio_files(audio_path, chunks)
         logger.info(f"Completed transcription for: {video_path}")
-        logger.debug(f"Transcript length: {len(full_transcript)} characters")
-        
-        return full_transcript.strip()
+        return transcript
     except Exception as e:
         logger.error(f"Transcription pipeline failed for {video_path}: {str(e)}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
@@ -7,23 +7,27 @@ Created on Thu Jul 14 14:06:01 2022
 
 import asyncio
 import browser_cookie3
-from bs4 import BeautifulSoup
 from datetime import datetime
 import json
-import numpy as np
 import os
-import pandas as pd
-import random
 import re
 import requests
-from TikTokApi import TikTokApi
+import threading
 import time
+from urllib.parse import urljoin, urlparse
+from utils.rate_limit import tiktok_limiter
+from utils.tiktok_sessions import TikTokSessionPool
+from utils.video_metadata import VideoMetadata
 
 global cookies
-cookies = dict()
+cookies = requests.cookies.RequestsCookieJar()
+# Import workers share one cookie jar; every read and merge goes through this lock
+_cookies_lock = threading.Lock()
+_sessions = threading.local()
 
 url_regex = '(?<=\.com/)(.+?)(?=\?|$)'
 video_id_regex = '(?<=/video/)([0-9]+)'
+post_id_regex = '/(?:video|photo)/([0-9]+)'
 
 ms_token = os.environ.get(
     "ms_token", None
@@ -45,15 +49,135 @@ runsb_err = 'No browser defined for cookie extraction. We strongly recommend you
 
 print(runsb_rec)
 
+# Browser sessions for TikTokApi calls, opened once and reused by listing and comment scraping
+session_pool = TikTokSessionPool(ms_tokens=[ms_token], context_options=context_dict)
+
 class BrowserNotSpecifiedError(Exception):
     def __init__(self):
         super().__init__(runsb_err)
 
-def specify_browser(browser):
+def egress_key(proxies=None):
+    """Rate-limit key for requests made with proxies: the proxy host, or 'direct'"""
+    if not proxies:
+        return 'direct'
+    proxy = proxies.get('https') or next(iter(proxies.values()))
+    return proxy.rsplit('@', 1)[-1]
+
+def get_session(proxies=None):
+    """This thread's keep-alive requests.Session for the given proxy settings.
+
+    Sessions are not safe to share between threads, so each worker thread
+    keeps one per proxy and reuses its pooled connections across requests.
+    """
+    by_proxy = getattr(_sessions, 'by_proxy', None)
+    if by_proxy is None:
+        by_proxy = _sessions.by_proxy = {}
+    key = json.dumps(proxies, sort_keys=True) if proxies else ''
+    session = by_proxy.get(key)
+    if session is None:
+        session = requests.Session()
+        if proxies:
+            session.proxies.update(proxies)
+        by_proxy[key] = session
+    return session
+
+def _cookie_snapshot():
+    with _cookies_lock:
+        return requests.cookies.merge_cookies(requests.cookies.RequestsCookieJar(), cookies)
+
+def _set_cookies(jar):
     global cookies
-    cookies = getattr(browser_cookie3,browser)(domain_name='.tiktok.com')
+    with _cookies_lock:
+        cookies = requests.cookies.merge_cookies(requests.cookies.RequestsCookieJar(), jar)
+
+def _session_get(url, proxies=None, **kwargs):
+    """GET through the thread's session for proxies, sending and retaining the shared cookies"""
+    session = get_session(proxies)
+    response = session.get(url, cookies=_cookie_snapshot(), **kwargs)
+    with _cookies_lock:
+        requests.cookies.merge_cookies(cookies, response.cookies)
+    # The shared jar is the only cookie store; don't let per-thread sessions drift from it
+    session.cookies.clear()
+    return response
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = (10, 60)  # connect, read (seconds); a stalled read triggers a Range resume
+DOWNLOAD_RESUME_ATTEMPTS = 3
+DOWNLOAD_PROGRESS_INTERVAL = 1.0
+
+class IncompleteDownloadError(IOError):
+    pass
+
+def download_file(file_url, file_fn, proxies=None, cancel_check=None, progress_callback=None):
+    """Stream file_url to file_fn in fixed-size chunks through a .part file.
+
+    A dropped or stalled connection is resumed with an HTTP Range request
+    (from scratch if the server ignores it), and the finished file is renamed
+    into place, so file_fn never holds a partial download. cancel_check()
+    runs between chunks and may raise to abort. progress_callback(stats) gets
+    bytes, total_bytes, seconds, bytes_per_second, resumes and done, at most
+    every DOWNLOAD_PROGRESS_INTERVAL seconds and once more when finished.
+    """
+    part_fn = file_fn + '.part'
+    request_headers = dict(headers, referer='https://www.tiktok.com/')
+    started = time.monotonic()
+    last_report = started
+    downloaded = 0
+    total = None
+    resumes = 0
+
+    def stats(done):
+        seconds = time.monotonic() - started
+        return {'bytes': downloaded, 'total_bytes': total, 'seconds': round(seconds, 3),
+                'bytes_per_second': int(downloaded / seconds) if seconds > 0 else 0,
+                'resumes': resumes, 'done': done}
+
+    try:
+        while True:
+            if downloaded:
+                request_headers['Range'] = f'bytes={downloaded}-'
+            else:
+                request_headers.pop('Range', None)
+            try:
+                with _session_get(file_url, proxies=proxies, allow_redirects=True, headers=request_headers,
+                                  stream=True, timeout=DOWNLOAD_TIMEOUT) as tt_video:
+                    tt_video.raise_for_status()
+                    if downloaded and tt_video.status_code != 206:
+                        downloaded = 0  # Range not honoured: start over
+                    if not downloaded:
+                        length = tt_video.headers.get('Content-Length')
+                        total = int(length) if length else None
+                    with open(part_fn, 'ab' if downloaded else 'wb') as fn:
+                        for chunk in tt_video.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            if cancel_check is not None:
+                                cancel_check()
+                            fn.write(chunk)
+                            downloaded += len(chunk)
+                            if progress_callback is not None and time.monotonic() - last_report >= DOWNLOAD_PROGRESS_INTERVAL:
+                                last_report = time.monotonic()
+                                progress_callback(stats(False))
+                if total is not None and downloaded < total:
+                    raise IncompleteDownloadError(f'connection closed after {downloaded} of {total} bytes')
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout, IncompleteDownloadError) as e:
+                if resumes >= DOWNLOAD_RESUME_ATTEMPTS:
+                    raise
+                resumes += 1
+                print(f"Download interrupted at {downloaded} bytes ({e}), resuming")
+        os.replace(part_fn, file_fn)
+    except BaseException:
+        if os.path.exists(part_fn):
+            os.remove(part_fn)
+        raise
+    if progress_callback is not None:
+        progress_callback(stats(True))
+
+def specify_browser(browser):
+    _set_cookies(getattr(browser_cookie3,browser)(domain_name='.tiktok.com'))
 
 def deduplicate_metadata(metadata_fn,video_df,dedup_field='video_id'):
+    import pandas as pd  # only the CSV export paths need pandas
     if os.path.exists(metadata_fn):
         metadata = pd.read_csv(metadata_fn,keep_default_na=False)
         combined_data = pd.concat([metadata,video_df])
@@ -63,127 +187,9 @@ def deduplicate_metadata(metadata_fn,video_df,dedup_field='video_id'):
     return combined_data.drop_duplicates(dedup_field)
 
 def generate_data_row(video_obj):
-    data_header = ['video_id',
-                   'video_timestamp',
-                   'video_duration',
-                   'video_locationcreated',
-                   'video_diggcount',
-                   'video_sharecount',
-                   'video_commentcount',
-                   'video_playcount',
-                   'video_description',
-                   'video_is_ad',
-                   'video_stickers',
-                   'author_username',
-                   'author_name',
-                   'author_followercount',
-                   'author_followingcount',
-                   'author_heartcount',
-                   'author_videocount',
-                   'author_diggcount',
-                   'author_verified',
-                   'poi_name',
-                   'poi_address',
-                   'poi_city']
-    data_list = []
-    data_list.append(video_obj['id'])
-    try:
-        ctime = video_obj['createTime']
-        data_list.append(datetime.fromtimestamp(int(ctime)).isoformat())
-    except Exception:
-        data_list.append('')
-    try:
-        data_list.append(video_obj['video']['duration'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['locationCreated'])
-    except Exception:
-        data_list.append('')
-    try:
-        data_list.append(video_obj['stats']['diggCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['stats']['shareCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['stats']['commentCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['stats']['playCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['desc'])
-    except Exception:
-        data_list.append('')
-    try:
-        data_list.append(video_obj['isAd'])
-    except Exception:
-        data_list.append(False)
-    try:
-        video_stickers = []
-        for sticker in video_obj['stickersOnItem']:
-            for text in sticker['stickerText']:
-                video_stickers.append(text)
-        data_list.append(';'.join(video_stickers))
-    except Exception:
-        data_list.append('')
-    try:
-        data_list.append(video_obj['author']['uniqueId'])
-    except Exception:
-        try:
-            data_list.append(video_obj['author'])
-        except Exception:
-            data_list.append('')
-    try:
-        data_list.append(video_obj['author']['nickname'])
-    except Exception:
-        try:
-            data_list.append(video_obj['nickname'])
-        except Exception:
-            data_list.append('')
-    try:
-        data_list.append(video_obj['authorStats']['followerCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['authorStats']['followingCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['authorStats']['heartCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['authorStats']['videoCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['authorStats']['diggCount'])
-    except Exception:
-        data_list.append(np.nan)
-    try:
-        data_list.append(video_obj['author']['verified'])
-    except Exception:
-        data_list.append(False)
-    try:
-        data_list.append(video_obj['poi']['name'])
-    except Exception:
-        data_list.append('')
-    try:
-        data_list.append(video_obj['poi']['address'])
-    except Exception:
-        data_list.append('')
-    try:
-        data_list.append(video_obj['poi']['city'])
-    except Exception:
-        data_list.append('')
-    data_row = pd.DataFrame(dict(zip(data_header,data_list)),index=[0])
-    return data_row
+    """One-row DataFrame of a video's metadata, for CSV export"""
+    import pandas as pd
+    return pd.DataFrame([VideoMetadata.from_item(video_obj).to_dict()])
 #currently unused, but leaving it in case it's needed later
 '''
 def fix_tt_url(tt_url):
@@ -194,165 +200,218 @@ def fix_tt_url(tt_url):
     else:
         return tt_url
 '''
-def get_tiktok_json(video_url,browser_name=None,proxies=None):
+MAX_LINK_REDIRECTS = 3
+
+def extract_video_id(video_url):
+    """Numeric TikTok id in a /video/ or /photo/ URL, or None"""
+    match = re.search(post_id_regex, video_url)
+    return match.group(1) if match else None
+
+def resolve_video_url(video_url, proxies=None):
+    """(video_id, url) for any TikTok post link.
+
+    Full /video/ and /photo/ URLs are parsed without a request; short links
+    (vm.tiktok.com, vt.tiktok.com, tiktok.com/t/...) are resolved by
+    following their redirects without fetching the page. The returned url
+    has no query string.
+    """
+    url = video_url
+    for _ in range(MAX_LINK_REDIRECTS + 1):
+        video_id = extract_video_id(urlparse(url).path)
+        if video_id:
+            parsed = urlparse(url)
+            return video_id, f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+        tiktok_limiter.wait(egress_key(proxies))
+        response = _session_get(url, proxies=proxies, headers=headers, allow_redirects=False, timeout=20)
+        tiktok_limiter.report(egress_key(proxies), response.status_code)
+        location = response.headers.get('Location')
+        response.close()
+        if not location:
+            break
+        url = urljoin(url, location)
+    raise ValueError(f"No TikTok video id found for {video_url}")
+
+TIKTOK_JSON_SCRIPT_IDS = ('SIGI_STATE', '__UNIVERSAL_DATA_FOR_REHYDRATION__')
+
+def _find_script_tag(html, script_id):
+    """Position of the id attribute of the <script id=script_id> tag, or -1"""
+    for marker in (f'id="{script_id}"', f"id='{script_id}'"):
+        pos = html.find(marker)
+        while pos != -1:
+            # The same text can appear earlier, e.g. inside another script or element
+            if html.rfind('<script', 0, pos) > html.rfind('>', 0, pos):
+                return pos
+            pos = html.find(marker, pos + 1)
+    return -1
+
+def extract_tiktok_json(html, script_ids=TIKTOK_JSON_SCRIPT_IDS):
+    """Parse the first <script id=...> JSON payload found among script_ids.
+
+    A str.find scan for the tag and its closing </script>, instead of
+    building a full parse tree of the page. Returns (script_id, data), or
+    (None, None) if none of the payloads is present.
+    """
+    for script_id in script_ids:
+        pos = _find_script_tag(html, script_id)
+        if pos == -1:
+            continue
+        start = html.find('>', pos) + 1
+        end = html.find('</script>', start)
+        if start == 0 or end == -1:
+            continue
+        try:
+            return script_id, json.loads(html[start:end])
+        except ValueError:
+            continue
+    return None, None
+
+def _fetch_page(video_url, browser_name=None, proxies=None):
     if 'cookies' not in globals() and browser_name is None:
         raise BrowserNotSpecifiedError
-    global cookies
     if browser_name is not None:
-        cookies = getattr(browser_cookie3,browser_name)(domain_name='.tiktok.com')
-    headers_updated = {
-        "User-Agent": context_dict['user_agent'],
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": "https://www.tiktok.com/",
-        "Connection": "keep-alive"
-    }
-    tt = requests.get(video_url,
+        _set_cookies(getattr(browser_cookie3,browser_name)(domain_name='.tiktok.com'))
+    # retains any new cookies that got set in this request
+    tt = _session_get(video_url,
+                      proxies=proxies,
                       headers=headers,
-                      cookies=cookies,
-                      timeout=20,
-                      proxies=proxies)
-    # retain any new cookies that got set in this request
-    cookies = tt.cookies
-    soup = BeautifulSoup(tt.text, "html.parser")
-    tt_script = soup.find('script', attrs={'id':"SIGI_STATE"})
-    try:
-        tt_json = json.loads(tt_script.string)
-    except AttributeError:
-        return
-    return tt_json
+                      timeout=20)
+    tiktok_limiter.report(egress_key(proxies), tt.status_code)
+    return tt.text
+
+def fetch_tiktok_json(video_url,browser_name=None,proxies=None):
+    """Fetch the page once and return (script_id, data) from whichever payload it carries"""
+    return extract_tiktok_json(_fetch_page(video_url, browser_name, proxies))
+
+def get_tiktok_json(video_url,browser_name=None,proxies=None):
+    return extract_tiktok_json(_fetch_page(video_url, browser_name, proxies), ('SIGI_STATE',))[1]
 
 def alt_get_tiktok_json(video_url,browser_name=None,proxies=None):
-    if 'cookies' not in globals() and browser_name is None:
-        raise BrowserNotSpecifiedError
-    global cookies
-    if browser_name is not None:
-        cookies = getattr(browser_cookie3,browser_name)(domain_name='.tiktok.com')
-    headers_updated = {
-        "User-Agent": context_dict['user_agent'],
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": "https://www.tiktok.com/",
-        "Connection": "keep-alive"
-    }
-    tt = requests.get(video_url,
-                      headers=headers,
-                      cookies=cookies,
-                      timeout=20,
-                      proxies=proxies)
-    # retain any new cookies that got set in this request
-    cookies = tt.cookies
-    soup = BeautifulSoup(tt.text, "html.parser")
-    tt_script = soup.find('script', attrs={'id':"__UNIVERSAL_DATA_FOR_REHYDRATION__"})
-    try:
-        tt_json = json.loads(tt_script.string)
-    except AttributeError:
+    tt_json = extract_tiktok_json(_fetch_page(video_url, browser_name, proxies),
+                                  ('__UNIVERSAL_DATA_FOR_REHYDRATION__',))[1]
+    if tt_json is None:
         print("The function encountered a downstream error and did not deliver any data, which happens periodically for various reasons. Please try again later.")
-        return
     return tt_json
 
+_metadata_log_lock = threading.Lock()
+
+def append_metadata(metadata_fp, metadata):
+    """Append one video's metadata to a log: a JSON line for .jsonl files (constant cost),
+    otherwise pyktok's CSV, which is re-read and rewritten on every call."""
+    with _metadata_log_lock:
+        if metadata_fp.endswith('.jsonl'):
+            with open(metadata_fp, 'a', encoding='utf-8') as fn:
+                fn.write(json.dumps(metadata.to_dict()) + '\n')
+            return
+        import pandas as pd  # only the CSV export needs pandas
+        data_row = pd.DataFrame([metadata.to_dict()])
+        if os.path.exists(metadata_fp):
+            data_row = pd.concat([pd.read_csv(metadata_fp, keep_default_na=False), data_row])
+        data_row.to_csv(metadata_fp, index=False)
+
 def save_tiktok(video_url,
                 save_video=False,
                 metadata_fn='',
                 browser_name=None,
-                return_fns=False,
                 save_dir='.',
-                proxies=None):
+                proxies=None,
+                cancel_check=None,
+                progress_callback=None,
+                rate_limit=True,
+                file_stem=None):
+    """Fetch one TikTok post, optionally saving its video (or slides) to save_dir.
+
+    Returns {'video_fn', 'image_fns', 'metadata', 'metadata_fn'}: the exact
+    files written for this URL and its VideoMetadata record. metadata_fn, if
+    given, is an append-only log in save_dir kept for offline analysis.
+    The page fetch waits for the shared rate limiter unless rate_limit is
+    False (the caller already holds a slot). Files are named after the URL
+    path unless file_stem is given.
+    """
     if 'cookies' not in globals() and browser_name is None:
         raise BrowserNotSpecifiedError
-    if save_video == False and metadata_fn == '':
-        print('Since save_video and metadata_fn are both False/blank, the program did nothing.')
-        return
 
     # Ensure save_dir exists
     os.makedirs(save_dir, exist_ok=True)
 
-    tt_json = get_tiktok_json(video_url, browser_name,proxies=proxies)
-    if tt_json is not None:
+    video_fn = None
+    image_fns = []
+    if rate_limit:
+        tiktok_limiter.wait(egress_key(proxies))
+    # One fetch; the page carries either the SIGI_STATE or the rehydration payload
+    script_id, tt_json = fetch_tiktok_json(video_url, browser_name, proxies=proxies)
+    if script_id == 'SIGI_STATE':
         video_id = list(tt_json['ItemModule'].keys())[0]
 
         if save_video:  
-            regex_url = re.findall(url_regex, video_url)[0]
+            stem = file_stem or re.findall(url_regex, video_url)[0].replace('/', '_')
             if 'imagePost' in tt_json['ItemModule'][video_id]:
                 slidecount = 1
                 for slide in tt_json['ItemModule'][video_id]['imagePost']['images']:
-                    video_fn = os.path.join(save_dir, regex_url.replace('/', '_') + f'_slide_{slidecount}.jpeg')
+                    image_fn = os.path.join(save_dir, stem + f'_slide_{slidecount}.jpeg')
                     tt_video_url = slide['imageURL']['urlList'][0]
-                    headers['referer'] = 'https://www.tiktok.com/'
-                    tt_video = requests.get(tt_video_url, allow_redirects=True, headers=headers, cookies=cookies,proxies=proxies)
-                    with open(video_fn, 'wb') as fn:
-                        fn.write(tt_video.content)
+                    download_file(tt_video_url, image_fn, proxies=proxies, cancel_check=cancel_check, progress_callback=progress_callback)
+                    image_fns.append(image_fn)
                     slidecount += 1
             else:
-                regex_url = re.findall(url_regex, video_url)[0]
-                video_fn = os.path.join(save_dir, regex_url.replace('/', '_') + '.mp4')
+                video_fn = os.path.join(save_dir, stem + '.mp4')
                 try:
                     tt_video_url = tt_json['ItemModule'][video_id]['video']['downloadAddr']
                 except:
                     tt_video_url = tt_json["__DEFAULT_SCOPE__"]['webapp.video-detail']['itemInfo']['itemStruct']['video']['downloadAddr']
-                headers['referer'] = 'https://www.tiktok.com/'
-                tt_video = requests.get(tt_video_url, allow_redirects=True, headers=headers, cookies=cookies,proxies=proxies)
-                with open(video_fn, 'wb') as fn:
-                    fn.write(tt_video.content)
+                download_file(tt_video_url, video_fn, proxies=proxies, cancel_check=cancel_check, progress_callback=progress_callback)
                 print("Saved video\n", tt_video_url, "\nto\n", video_fn)
 
-        if metadata_fn != '':
-            data_slot = tt_json['ItemModule'][video_id]
-            data_row = generate_data_row(data_slot)
-            try:
-                user_id = list(tt_json['UserModule']['users'].keys())[0]
-                data_row.loc[0, "author_verified"] = tt_json['UserModule']['users'][user_id]['verified']
-            except Exception:
-                pass
-            metadata_fp = os.path.join(save_dir, metadata_fn)
-            if os.path.exists(metadata_fp):
-                metadata = pd.read_csv(metadata_fp, keep_default_na=False)
-                combined_data = pd.concat([metadata, data_row])
-            else:
-                combined_data = data_row
-            combined_data.to_csv(metadata_fp, index=False)
+        try:
+            user_id = list(tt_json['UserModule']['users'].keys())[0]
+            author_verified = tt_json['UserModule']['users'][user_id]['verified']
+        except Exception:
+            author_verified = None
+        metadata = VideoMetadata.from_item(tt_json['ItemModule'][video_id], author_verified=author_verified)
 
     else:
-        
-        tt_json = alt_get_tiktok_json(video_url, browser_name)
+        if tt_json is None:
+            raise ValueError(f"No TikTok data found for {video_url}")
         if save_video:
-            regex_url = re.findall(url_regex, video_url)[0]
-            video_fn = os.path.join(save_dir, regex_url.replace('/', '_') + '.mp4')
+            stem = file_stem or re.findall(url_regex, video_url)[0].replace('/', '_')
+            video_fn = os.path.join(save_dir, stem + '.mp4')
             try:
                 tt_video_url = tt_json["__DEFAULT_SCOPE__"]['webapp.video-detail']['itemInfo']['itemStruct']['video']['playAddr']
                 if tt_video_url == '':
                     raise
             except:
                 tt_video_url = tt_json["__DEFAULT_SCOPE__"]['webapp.video-detail']['itemInfo']['itemStruct']['video']['downloadAddr']
-            headers['referer'] = 'https://www.tiktok.com/'
-            tt_video = requests.get(tt_video_url, allow_redirects=True, headers=headers, cookies=cookies,proxies=proxies)
-            with open(video_fn, 'wb') as fn:
-                fn.write(tt_video.content)
+            download_file(tt_video_url, video_fn, proxies=proxies, cancel_check=cancel_check, progress_callback=progress_callback)
             print("Saved video\n", video_url, "\nto\n", video_fn)
 
-        if metadata_fn != '':
-            data_slot = tt_json["__DEFAULT_SCOPE__"]['webapp.video-detail']['itemInfo']['itemStruct']
-            data_row = generate_data_row(data_slot)
-            try:    
-                data_row.loc[0, "author_verified"] = tt_json["__DEFAULT_SCOPE__"]['webapp.video-detail']['itemInfo']['itemStruct']['author']
-            except Exception:
-                pass
-            metadata_fp = os.path.join(save_dir, metadata_fn)
-            if os.path.exists(metadata_fp):
-                metadata = pd.read_csv(metadata_fp, keep_default_na=False)
-                combined_data = pd.concat([metadata, data_row])
-            else:
-                combined_data = data_row
-            combined_data.to_csv(metadata_fp, index=False)
-            print("Saved metadata for video\n", video_url, "\nto\n", metadata_fp)
+        metadata = VideoMetadata.from_item(tt_json["__DEFAULT_SCOPE__"]['webapp.video-detail']['itemInfo']['itemStruct'])
+
+    metadata_fp = None
+    if metadata_fn != '':
+        metadata_fp = os.path.join(save_dir, metadata_fn)
+        append_metadata(metadata_fp, metadata)
 
-        if return_fns:
-            return {'video_fn': video_fn, 'metadata_fn': metadata_fp}
+    return {'video_fn': video_fn, 'image_fns': image_fns, 'metadata': metadata, 'metadata_fn': metadata_fp}
 
-# the function below is based on this one: https://github.com/davidteather/TikTok-Api/blob/main/examples/user_example.py
+# the functions below are based on this one: https://github.com/davidteather/TikTok-Api/blob/main/examples/user_example.py
+
+async def _list_videos(api, tt_ent, ent_type, video_ct):
+    tt_list = []
+    if ent_type == 'user':
+        ent = api.user(tt_ent)
+    elif ent_type == 'hashtag':
+        ent = api.hashtag(name=tt_ent)
+    else:
+        ent = api.video(url=tt_ent)
 
+    if ent_type in ['user','hashtag']:
+        async for video in ent.videos(count=video_ct):
+            tt_list.append(video.as_dict)
+    else:
+        async for related_video in ent.related_videos(count=video_ct):
+            tt_list.append(related_video.as_dict)
+    return tt_list
+
+# headless is kept for compatibility; pooled sessions use TIKTOK_SESSION_HEADLESS
 async def get_video_urls(tt_ent,
                          ent_type="user",
                          video_ct=30,
@@ -362,27 +421,9 @@ async def get_video_urls(tt_ent,
 
     url_p1 = "https://www.tiktok.com/@"
     url_p2 = "/video/"
-    tt_list = []
 
-    async with TikTokApi() as api:
-        await api.create_sessions(headless=headless,
-                                  ms_tokens=[ms_token],
-                                  num_sessions=1,
-                                  sleep_after=3,
-                                  context_options=context_dict)
-        if ent_type == 'user':
-            ent = api.user(tt_ent)
-        elif ent_type == 'hashtag':
-            ent = api.hashtag(name=tt_ent)
-        else:
-            ent = api.video(url=tt_ent)
-
-        if ent_type in ['user','hashtag']:
-            async for video in ent.videos(count=video_ct):
-                tt_list.append(video.as_dict)
-        else:
-            async for related_video in ent.related_videos(count=video_ct):
-                tt_list.append(related_video.as_dict)
+    await tiktok_limiter.wait_async(egress_key())
+    tt_list = await session_pool.run(_list_videos, tt_ent, ent_type, video_ct)
 
     id_list = [i['id'] for i in tt_list]
     if ent_type == 'user':
@@ -406,9 +447,9 @@ def save_tiktok_multi_urls(video_urls,
         tt_urls = open(video_urls).read().splitlines()
     else:
         tt_urls = video_urls
+    # Pacing comes from the shared rate limiter inside save_tiktok; sleep is kept for compatibility
     for u in tt_urls:
         save_tiktok(u,save_video,metadata_fn,browser_name)
-        time.sleep(random.randint(1, sleep))
     print('Saved',len(tt_urls),'videos and/or lines of metadata')
 
 def save_tiktok_multi_page(tt_ent,
@@ -431,19 +472,43 @@ def save_tiktok_multi_page(tt_ent,
 
 # the function below is based on this one: https://github.com/davidteather/TikTok-Api/blob/main/examples/comment_example.py
 
-async def get_comments(video_id,comment_count=30,headless=True):
+async def _list_comments(api, video_id, comment_count):
     comment_list = []
-    async with TikTokApi() as api:
-        await api.create_sessions(headless=headless,
-                                  ms_tokens=[ms_token],
-                                  num_sessions=1,
-                                  sleep_after=3,
-                                  context_options=context_dict)
-        video = api.video(id=video_id)
-        async for comment in video.comments(count=comment_count):
-            comment_list.append(comment.as_dict)
+    video = api.video(id=video_id)
+    async for comment in video.comments(count=comment_count):
+        comment_list.append(comment.as_dict)
+    return comment_list
+
+async def get_comments(video_id,comment_count=30,headless=True):
+    await tiktok_limiter.wait_async(egress_key())
+    comment_list = await session_pool.run(_list_comments, video_id, comment_count)
+    import pandas as pd  # comments are returned as a DataFrame for CSV export
     return pd.DataFrame(comment_list)
 
+async def _list_new_comments(api, video_id, since, limit, stop_after_seen):
+    comment_list = []
+    seen_run = 0
+    video = api.video(id=video_id)
+    async for comment in video.comments(count=limit):
+        raw = comment.as_dict
+        # TikTok lists comments by relevance, not time, so stop after a run of older ones
+        if since is not None and raw.get('create_time', 0) < since:
+            seen_run += 1
+            if seen_run >= stop_after_seen:
+                break
+            continue
+        seen_run = 0
+        comment_list.append(raw)
+    return comment_list
+
+def get_new_comments(video_id, since=None, limit=500, stop_after_seen=50, timeout=None):
+    """Raw comments on video_id created at or after since (a create_time), for callers without an event loop
+
+    Raises concurrent.futures.TimeoutError if the listing takes longer than timeout seconds.
+    """
+    tiktok_limiter.wait(egress_key())
+    return session_pool.run_sync(_list_new_comments, video_id, since, limit, stop_after_seen, timeout=timeout)
+
 def save_tiktok_comments(video_url,
                          filename='',
                          comment_count=30,
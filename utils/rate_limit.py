@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+THROTTLE_STATUSES = (429, 403)
+
+class TokenBucket:
+    """Token bucket with AIMD rate adaptation.
+
+    reserve() always takes a token and returns how long the caller must wait
+    before using it (tokens may go negative), so callers can wait without a
+    thread: sleep, asyncio.sleep or a deferred pipeline retry. A throttling
+    response halves the rate (down to min_rate); each success adds
+    increase back, up to max_rate.
+    """
+    def __init__(self, rate: float, burst: float, min_rate: float = None, increase: float = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate or rate / 16
+        self.increase = increase or rate / 20
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            delay = max(0.0, -self._tokens / self.rate)
+            self.acquired += 1
+            self.total_wait += delay
+            self.max_wait = max(self.max_wait, delay)
+            return delay
+
+    def on_throttled(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+            self.throttled += 1
+
+    def on_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "avg_wait_seconds": round(self.total_wait / self.acquired, 3) if self.acquired else 0.0,
+                "max_wait_seconds": round(self.max_wait, 3),
+            }
+
+class RateLimiter:
+    """One TokenBucket per egress key (proxy host, or "direct")
+
+    overrides maps a key to {"rate": ..., "burst": ...} for proxies whose
+    limits differ from the defaults.
+    """
+    def __init__(self, rate: float, burst: float, overrides: Dict[str, Dict[str, float]] = None):
+        self.rate = rate
+        self.burst = burst
+        self.overrides = dict(overrides or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                limits = self.overrides.get(key, {})
+                bucket = TokenBucket(limits.get("rate", self.rate), limits.get("burst", self.burst))
+                self._buckets[key] = bucket
+            return bucket
+
+    def reserve(self, key: str) -> float:
+        """Take a token for key; returns the seconds to wait before making the request"""
+        return self.bucket(key).reserve()
+
+    def wait(self, key: str):
+        """Blocking acquire, for callers that have a thread to spare"""
+        delay = self.reserve(key)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, key: str):
+        delay = self.reserve(key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def report(self, key: str, status_code: int):
+        """Feed a response status back: 429/403 back off, successes recover the rate"""
+        bucket = self.bucket(key)
+        if status_code in THROTTLE_STATUSES:
+            bucket.on_throttled()
+            logger.warning(f"Throttled by TikTok via {key} (HTTP {status_code}); rate now {bucket.rate:.2f}/s")
+        elif status_code < 400:
+            bucket.on_success()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {key: bucket.stats() for key, bucket in buckets.items()}
+
+# Shared by every TikTok fetch path in this process
+tiktok_limiter = RateLimiter(
+    rate=settings.get("TIKTOK_RATE_LIMIT", 2),  # requests per second per egress
+    burst=settings.get("TIKTOK_RATE_BURST", 5),
+    overrides=settings.get("TIKTOK_RATE_LIMITS", {}),  # {"proxy-host:port": {"rate": 5, "burst": 10}}
+)
@@ -0,0 +1,201 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+from TikTokApi import TikTokApi
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+SESSION_POOL_SIZE = settings.get("TIKTOK_SESSION_POOL_SIZE", 2)  # browsers kept open
+SESSION_MAX_USES = settings.get("TIKTOK_SESSION_MAX_USES", 200)  # recycle a browser after this many calls
+SESSION_HEALTHCHECK_INTERVAL = settings.get("TIKTOK_SESSION_HEALTHCHECK_INTERVAL", 120)  # seconds
+SESSION_HEADLESS = settings.get("TIKTOK_SESSION_HEADLESS", True)
+
+class _PooledSession:
+    __slots__ = ("api", "created_at", "uses")
+
+    def __init__(self, api: TikTokApi):
+        self.api = api
+        self.created_at = time.time()
+        self.uses = 0
+
+class TikTokSessionPool:
+    """Long-lived TikTokApi browser sessions, shared by listing and comment scraping.
+
+    Each pooled entry is a TikTokApi instance with one browser session. They
+    live on a dedicated event-loop thread, are created on demand up to size,
+    and are handed out one call at a time. An entry is recycled (closed and
+    replaced on the next call) when a call on it raises, after max_uses
+    calls, or when an idle health check finds its page unresponsive.
+
+    run(fn, *args) awaits fn(api, *args) on the pool's loop from any event
+    loop; run_sync does the same from plain threads.
+    """
+    def __init__(self, ms_tokens: List[str], context_options: Dict[str, Any], size: int = SESSION_POOL_SIZE,
+                 max_uses: int = SESSION_MAX_USES, healthcheck_interval: float = SESSION_HEALTHCHECK_INTERVAL,
+                 headless: bool = SESSION_HEADLESS):
+        self._ms_tokens = ms_tokens
+        self._context_options = context_options
+        self._size = size
+        self._max_uses = max_uses
+        self._healthcheck_interval = healthcheck_interval
+        self._headless = headless
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Only touched on the pool's loop
+        self._idle: List[_PooledSession] = []
+        self._open = 0
+        self._available = None
+        self._healthcheck_task = None
+        self._created = 0
+        self._recycled = 0
+        self._calls = 0
+        self._failures = 0
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, name="tiktok-sessions", daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self):
+        self._available = asyncio.Condition()
+        self._healthcheck_task = asyncio.get_running_loop().create_task(self._healthcheck_loop())
+
+    async def _open_session(self) -> _PooledSession:
+        api = TikTokApi()
+        try:
+            await api.create_sessions(headless=self._headless,
+                                      ms_tokens=self._ms_tokens,
+                                      num_sessions=1,
+                                      sleep_after=3,
+                                      context_options=self._context_options)
+        except Exception:
+            await self._close_api(api)
+            raise
+        self._created += 1
+        logger.info(f"Opened TikTok browser session ({self._open} of {self._size} in use)")
+        return _PooledSession(api)
+
+    async def _close_api(self, api: TikTokApi):
+        try:
+            await api.close_sessions()
+            await api.stop_playwright()
+        except Exception as e:
+            logger.warning(f"Closing TikTok session failed: {str(e)}")
+
+    async def _acquire(self) -> _PooledSession:
+        async with self._available:
+            while not self._idle and self._open >= self._size:
+                await self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return await self._open_session()
+        except Exception:
+            async with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+
+    async def _release(self, entry: _PooledSession, failed: bool):
+        if failed or entry.uses >= self._max_uses:
+            self._recycled += 1
+            await self._close_api(entry.api)
+            async with self._available:
+                self._open -= 1
+                self._available.notify()
+            return
+        async with self._available:
+            self._idle.append(entry)
+            self._available.notify()
+
+    async def _run(self, fn: Callable[..., Awaitable[Any]], *args):
+        entry = await self._acquire()
+        entry.uses += 1
+        self._calls += 1
+        failed = False
+        try:
+            return await fn(entry.api, *args)
+        except (Exception, asyncio.CancelledError):
+            # Cancelled calls (run_sync timeouts) may have left the page hung, so recycle those too
+            failed = True
+            self._failures += 1
+            raise
+        finally:
+            await self._release(entry, failed)
+
+    async def _healthcheck_loop(self):
+        while True:
+            await asyncio.sleep(self._healthcheck_interval)
+            async with self._available:
+                idle, self._idle = self._idle, []
+            for entry in idle:
+                try:
+                    await asyncio.wait_for(entry.api.sessions[0].page.evaluate("() => 1"), timeout=10)
+                    healthy = True
+                except Exception as e:
+                    logger.warning(f"TikTok session failed its health check, recycling: {str(e)}")
+                    healthy = False
+                await self._release(entry, not healthy)
+
+    def submit(self, fn: Callable[..., Awaitable[Any]], *args) -> concurrent.futures.Future:
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._run(fn, *args), self._loop)
+
+    async def run(self, fn: Callable[..., Awaitable[Any]], *args):
+        """Await fn(api, *args) on a pooled session, from any event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def run_sync(self, fn: Callable[..., Awaitable[Any]], *args, timeout: float = None):
+        """fn(api, *args) from a plain thread; after timeout seconds the call is cancelled and TimeoutError raised"""
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def _stats(self) -> Dict[str, int]:
+        return {
+            "size": self._size,
+            "open": self._open,
+            "idle": len(self._idle),
+            "created": self._created,
+            "recycled": self._recycled,
+            "calls": self._calls,
+            "failures": self._failures,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        if self._loop is None:
+            return {"size": self._size, "open": 0}
+        return asyncio.run_coroutine_threadsafe(self._stats(), self._loop).result(timeout=5)
+
+    async def _close_all(self):
+        self._healthcheck_task.cancel()
+        async with self._available:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            await self._close_api(entry.api)
+
+    def close(self):
+        """Close the idle browsers and stop the loop thread (sessions in use are left to the process exit)"""
+        with self._start_lock:
+            if self._loop is None:
+                return
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(timeout=30)
+            finally:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+                self._loop = None
@@ -0,0 +1,101 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+def _path(obj, *keys):
+    """obj[k1][k2]..., or None if any level is missing"""
+    for key in keys:
+        if not isinstance(obj, dict) or key not in obj:
+            return None
+        obj = obj[key]
+    return obj
+
+class VideoMetadata:
+    """One video's metadata, built straight from TikTok's item JSON.
+
+    Missing values are None rather than NaN/'', so the record goes into
+    Postgres as-is. Field names match the videos table (and pyktok's CSV
+    columns); to_dict() gives the JSON/CSV form and from_dict() reads it back.
+    """
+    __slots__ = (
+        "video_id", "video_timestamp", "video_duration", "video_locationcreated",
+        "video_diggcount", "video_sharecount", "video_commentcount", "video_playcount",
+        "video_description", "video_is_ad", "video_stickers",
+        "author_username", "author_name", "author_followercount", "author_followingcount",
+        "author_heartcount", "author_videocount", "author_diggcount", "author_verified",
+        "poi_name", "poi_address", "poi_city",
+    )
+    video_id: Optional[str]
+    video_timestamp: Optional[str]
+    video_duration: Optional[int]
+    video_locationcreated: Optional[str]
+    video_diggcount: Optional[int]
+    video_sharecount: Optional[int]
+    video_commentcount: Optional[int]
+    video_playcount: Optional[int]
+    video_description: Optional[str]
+    video_is_ad: bool
+    video_stickers: Optional[str]
+    author_username: Optional[str]
+    author_name: Optional[str]
+    author_followercount: Optional[int]
+    author_followingcount: Optional[int]
+    author_heartcount: Optional[int]
+    author_videocount: Optional[int]
+    author_diggcount: Optional[int]
+    author_verified: bool
+    poi_name: Optional[str]
+    poi_address: Optional[str]
+    poi_city: Optional[str]
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values.pop(field, None))
+        if values:
+            raise TypeError(f"Unknown metadata fields: {', '.join(values)}")
+        self.video_is_ad = bool(self.video_is_ad)
+        self.author_verified = bool(self.author_verified)
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any], author_verified: Optional[bool] = None) -> "VideoMetadata":
+        """From a SIGI_STATE ItemModule entry or a rehydration itemStruct"""
+        author = item.get("author")
+        create_time = item.get("createTime")
+        stickers = [
+            text for sticker in item.get("stickersOnItem") or [] for text in sticker.get("stickerText") or []
+        ]
+        return cls(
+            video_id=str(item["id"]) if item.get("id") is not None else None,
+            video_timestamp=datetime.fromtimestamp(int(create_time)).isoformat() if create_time else None,
+            video_duration=_path(item, "video", "duration"),
+            video_locationcreated=item.get("locationCreated"),
+            video_diggcount=_path(item, "stats", "diggCount"),
+            video_sharecount=_path(item, "stats", "shareCount"),
+            video_commentcount=_path(item, "stats", "commentCount"),
+            video_playcount=_path(item, "stats", "playCount"),
+            video_description=item.get("desc"),
+            video_is_ad=item.get("isAd", False),
+            video_stickers=";".join(stickers) if stickers else None,
+            # SIGI_STATE items carry the author as a plain username
+            author_username=author.get("uniqueId") if isinstance(author, dict) else author,
+            author_name=author.get("nickname") if isinstance(author, dict) else item.get("nickname"),
+            author_followercount=_path(item, "authorStats", "followerCount"),
+            author_followingcount=_path(item, "authorStats", "followingCount"),
+            author_heartcount=_path(item, "authorStats", "heartCount"),
+            author_videocount=_path(item, "authorStats", "videoCount"),
+            author_diggcount=_path(item, "authorStats", "diggCount"),
+            author_verified=author_verified if author_verified is not None else _path(item, "author", "verified"),
+            poi_name=_path(item, "poi", "name"),
+            poi_address=_path(item, "poi", "address"),
+            poi_city=_path(item, "poi", "city"),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "VideoMetadata":
+        """From to_dict() output (e.g. a job checkpoint); unknown keys are ignored"""
+        return cls(**{field: data.get(field) for field in cls.__slots__})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"VideoMetadata(video_id={self.video_id!r}, author_username={self.author_username!r})"
@@ -0,0 +1,108 @@
+"""
+Standalone import worker.
+
+Claims import jobs from the Postgres jobs table and runs the import stages
+for them, so import capacity scales independently of the API. Requires
+JOB_STORE = "postgres"; run the API with IMPORT_MODE = "queue" so it only
+enqueues.
+
+    python worker.py --concurrency 4
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import importer
+from jobs_progress import (
+    JOB_STORE, JobCancelled, claim_next_job, renew_lease, release_job, requeue_job, fail_exhausted_jobs
+)
+from utils.utils import get_settings, get_logger
+
+# Initialize settings and logger
+settings = get_settings()
+logger = get_logger(settings.LOGS_PATH)
+
+LEASE_SECONDS = settings.get("WORKER_LEASE_SECONDS", 120)
+HEARTBEAT_INTERVAL = settings.get("WORKER_HEARTBEAT_INTERVAL", 30)
+POLL_INTERVAL = settings.get("WORKER_POLL_INTERVAL", 2)
+MAX_ATTEMPTS = settings.get("IMPORT_MAX_ATTEMPTS", 3)
+
+stop_event = threading.Event()
+
+def heartbeat(job_id: str, worker_id: str, done: threading.Event):
+    """Keep the lease alive while the job runs"""
+    while not done.wait(HEARTBEAT_INTERVAL):
+        try:
+            if not renew_lease(job_id, worker_id, LEASE_SECONDS):
+                logger.warning(f"[{worker_id}] lost lease on job {job_id}")
+                return
+        except Exception as e:
+            logger.warning(f"[{worker_id}] heartbeat failed for job {job_id}: {str(e)}")
+
+def process_job(job_id: str, job: dict, worker_id: str):
+    logger.info(f"[{worker_id}] claimed job {job_id} (attempt {job['attempts']}) for URL: {job['url']}")
+    done = threading.Event()
+    beat = threading.Thread(target=heartbeat, args=(job_id, worker_id, done), daemon=True)
+    beat.start()
+    ctx = None
+    try:
+        ctx, start_at = importer.resume_import(job_id, job["user_id"], job["url"])
+        importer.run_stages(ctx, start_at)
+    except JobCancelled as e:
+        importer.handle_import_error(ctx, e)
+    except Exception as e:
+        if job["attempts"] < MAX_ATTEMPTS:
+            logger.warning(f"[{worker_id}] job {job_id} failed, requeueing: {str(e)}")
+            if requeue_job(job_id, worker_id, f"Attempt {job['attempts']} failed, retrying: {str(e)}"):
+                return
+            logger.warning(f"[{worker_id}] job {job_id} could not be requeued, failing it")
+        importer.handle_import_error(ctx or importer.new_import(job_id, job["user_id"], job["url"]), e)
+    finally:
+        done.set()
+        beat.join()
+        release_job(job_id, worker_id)
+
+def worker_loop(worker_id: str):
+    while not stop_event.is_set():
+        try:
+            fail_exhausted_jobs(MAX_ATTEMPTS)
+            claimed = claim_next_job(worker_id, LEASE_SECONDS, MAX_ATTEMPTS)
+        except Exception as e:
+            logger.error(f"[{worker_id}] failed to claim a job: {str(e)}")
+            claimed = None
+        if claimed is None:
+            stop_event.wait(POLL_INTERVAL)
+            continue
+        try:
+            process_job(claimed[0], claimed[1], worker_id)
+        except Exception:
+            # Bookkeeping (requeue, fail, release) failed; the lease expires and the job is claimed again
+            logger.exception(f"[{worker_id}] error while handling job {claimed[0]}")
+    logger.info(f"[{worker_id}] stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=settings.get("WORKER_CONCURRENCY", 4))
+    args = parser.parse_args()
+
+    if JOB_STORE != "postgres":
+        raise SystemExit('worker.py needs JOB_STORE = "postgres"')
+
+    # Finish the jobs in hand on SIGTERM/SIGINT, but claim nothing new
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop_event.set())
+
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=worker_loop, args=(f"{base_id}:{n}",), name=f"import-worker-{n}")
+        for n in range(args.concurrency)
+    ]
+    logger.info(f"Starting {args.concurrency} import workers ({base_id})")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+if __name__ == "__main__":
+    main()